@@ -0,0 +1,281 @@
+""" This module contains the AssetManager class, which loads images in the background. Images are decoded on a thread pool while the game starts, and
+are converted to the pixel format of the display on the main thread once they are decoded. Loading an image returns an Asset handle at once, which gives a
+placeholder until the image is ready, or blocks until it is ready when the image is needed right away.
+
+Images are read from the texture atlas cache when it holds an up to date copy, see TextureAtlas. Images which had to be decoded from their files are packed
+into a new cache once everything requested has loaded, so the next start reads them from the cache as well.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame as pg
+from config import *
+from textures import TextureAtlas, surface_pixels
+
+class Asset:
+    """ Handle to an image loaded by an AssetManager. Decoding starts when the image is requested, either when the handle is made or the first time the
+    image is used.
+
+    Attributes
+    ----------
+    name : str
+        Name of image, its path relative to the texture directory with / as separator.
+    requested : bool
+        True if decoding of the image has started.
+    ready : bool
+        True if the image is decoded and converted.
+    surface : pygame.Surface
+        The image if it is ready, otherwise a transparent placeholder.
+
+    Methods
+    -------
+    get()
+        Return the image, waiting for it to be ready.
+    """
+    def __init__(self, manager, name:str):
+        """
+        Args
+        ----
+        manager : AssetManager
+            Manager loading the image.
+        name : str
+            Name of image.
+        """
+        self.manager = manager
+        self.name = name
+        self._future = None
+        self._surface = None
+        self._placeholder = None
+
+    @property
+    def requested(self) -> bool:
+        return self._future is not None
+
+    @property
+    def ready(self) -> bool:
+        return self._surface is not None
+
+    @property
+    def surface(self) -> pg.Surface:
+        if self._surface is None:
+            self.manager.request(self)
+            if self._placeholder is None:
+                self._placeholder = pg.Surface((TILESIZE, TILESIZE), pg.SRCALPHA)
+            return self._placeholder
+        return self._surface
+
+    def get(self) -> pg.Surface:
+        """ Return the image, waiting for it to be ready. The same surface is returned every time.
+
+        Returns
+        -------
+        image : pygame.Surface
+            The image, converted to the pixel format of the display unless the manager does not convert.
+        """
+        if self._surface is None:
+            self.manager.request(self)
+            self.manager.finish(self)
+        return self._surface
+
+class AssetManager:
+    """ Loads images on a thread pool. pygame releases the GIL while decoding an image, so several images are decoded at the same time and the main
+    thread can go on with the game meanwhile. Converting an image needs the display and is done on the main thread in finalize() or when an Asset is
+    needed right away.
+
+    Attributes
+    ----------
+    root : str
+        Texture directory.
+    cache : str|None
+        Path to texture atlas cache. If None images are always decoded from their files.
+    convert : bool
+        Convert images to the pixel format of the display. Must be False without a display.
+
+    Methods
+    -------
+    load(name, prefetch=True)
+        Return the handle of an image.
+    load_dir(folder, prefetch=None)
+        Return the handles of all images in a folder.
+    request(asset)
+        Start decoding an image.
+    finalize()
+        Convert the images which have been decoded, and update the cache once everything requested has loaded.
+    finish(asset)
+        Wait for an image to be decoded and convert it.
+    """
+    def __init__(self, root:str, cache=None, convert=True, workers=ASSET_WORKERS):
+        """
+        Args
+        ----
+        root : str
+            Texture directory.
+        cache : str|None
+            Path to texture atlas cache. (default None)
+        convert : bool
+            Convert images to the pixel format of the display. (default True)
+        workers : int
+            Number of threads decoding images. (default ASSET_WORKERS)
+        """
+        self.root = root
+        self.cache = cache
+        self.convert = convert
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._assets = {}
+        self._pending = []
+
+        # The cache is read first, decoding jobs wait for it to know if their image is in it. The cached atlas is converted once, the first time an image
+        # from it is finished.
+        self._atlas = self._pool.submit(TextureAtlas.read, cache) if cache is not None else None
+        self._converted = None
+
+        # Images decoded from their files, and their modification times, to be packed into the next cache.
+        self._decoded = {}
+        self._sources = {}
+        self._dirty = False
+
+    def _path(self, name:str) -> str:
+        """ Return the path to the file of an image. """
+        return os.path.join(self.root, *name.split("/"))
+
+    def load(self, name:str, prefetch=True) -> Asset:
+        """ Return the handle of an image. There is one handle per image.
+
+        Args
+        ----
+        name : str
+            Name of image, relative to the texture directory.
+        prefetch : bool
+            Start decoding the image now. Otherwise it is decoded when it is first used. (default True)
+
+        Returns
+        -------
+        asset : Asset
+            Handle of the image.
+        """
+        asset = self._assets.get(name)
+        if asset is None:
+            asset = self._assets[name] = Asset(self, name)
+        if prefetch:
+            self.request(asset)
+        return asset
+
+    def load_dir(self, folder:str, prefetch=None) -> dict:
+        """ Return the handles of all images in a folder.
+
+        Args
+        ----
+        folder : str
+            Folder relative to the texture directory.
+        prefetch : container[str]|None
+            Keys of the images to start decoding now. If None all images are decoded now. (default None)
+
+        Returns
+        -------
+        assets : dict
+            Maps the file names without extension, in sorted order, to the handles of the images.
+        """
+        assets = {}
+        for file in sorted(os.listdir(self._path(folder))):
+            key = file.split(".")[0]
+            assets[key] = self.load(f"{folder}/{file}", prefetch is None or key in prefetch)
+        return assets
+
+    def request(self, asset:Asset) -> None:
+        """ Start decoding an image, unless it already has been.
+
+        Args
+        ----
+        asset : Asset
+            Handle of the image.
+        """
+        if asset._future is None:
+            asset._future = self._pool.submit(self._decode, asset.name)
+            self._pending.append(asset)
+
+    def _decode(self, name:str) -> tuple:
+        """ Decode an image on a worker thread. Returns (None, mtime) if the cached atlas has an up to date copy, otherwise the decoded image. """
+        mtime = os.stat(self._path(name)).st_mtime_ns
+        if self._atlas is not None:
+            atlas, sources = self._atlas.result()
+            if atlas is not None and sources.get(name) == mtime:
+                return None, mtime
+        return pg.image.load(self._path(name)), mtime
+
+    def finish(self, asset:Asset) -> None:
+        """ Wait for an image to be decoded and convert it. Must be called on the main thread.
+
+        Args
+        ----
+        asset : Asset
+            Handle of a requested image.
+        """
+        if asset._surface is not None:
+            return
+
+        img, mtime = asset._future.result()
+        self._sources[asset.name] = mtime
+
+        if img is None:
+            # The image is in the cached atlas. Subsurfaces of the converted atlas share its pixels.
+            atlas, _ = self._atlas.result()
+            if self._converted is None:
+                self._converted = atlas.surface.convert_alpha() if self.convert else atlas.surface
+            asset._surface = self._converted.subsurface(atlas.area(asset.name))
+        else:
+            self._decoded[asset.name] = img
+            self._dirty = True
+            asset._surface = img.convert_alpha() if self.convert else img
+
+        self._pending.remove(asset)
+
+    def finalize(self) -> int:
+        """ Convert the images which have been decoded. Once everything requested has loaded, images decoded from their files are written to the cache in
+        the background. Must be called on the main thread, e.g. once per frame.
+
+        Returns
+        -------
+        n : int
+            Number of images which became ready.
+        """
+        done = [asset for asset in self._pending if asset._future.done()]
+        for asset in done:
+            self.finish(asset)
+
+        if self._dirty and not self._pending and self.cache is not None:
+            self._dirty = False
+
+            # Surfaces must not be shared with the worker thread, the game may be blitting from them, e.g. from the cached atlas when images are not
+            # converted. Their pixels are copied here, and only the copies are packed on the worker.
+            decoded = {name: surface_pixels(img) for name, img in self._decoded.items()}
+            atlas, cached = self._atlas.result()
+            old = (atlas.regions, surface_pixels(atlas.surface), cached) if atlas is not None else None
+            self._pool.submit(self._save, decoded, old, dict(self._sources))
+        return len(done)
+
+    def _save(self, decoded:dict, old, sources:dict) -> None:
+        """ Write all loaded images to the cache on a worker thread. Images of the old cache which are still up to date are kept, also those which were
+        not used this time.
+
+        Args
+        ----
+        decoded : dict
+            Maps names of images decoded from their files to their pixels.
+        old : tuple|None
+            Regions, pixels and modification times of the sources of the old cache, None if there was none.
+        sources : dict
+            Modification times of the sources of the decoded images.
+        """
+        pixels = {}
+
+        if old is not None:
+            regions, sheet, cached = old
+            for name, mtime in cached.items():
+                if name not in decoded and os.path.exists(self._path(name)) and os.stat(self._path(name)).st_mtime_ns == mtime:
+                    rect = regions[name]
+                    pixels[name] = sheet[rect.top:rect.bottom, rect.left:rect.right]
+                    sources.setdefault(name, mtime)
+
+        pixels.update(decoded)
+        TextureAtlas.from_pixels(pixels).save(self.cache, sources)
@@ -0,0 +1,168 @@
+""" Batch runner for evaluating pilots over many matches. Matches are simulated headless on a pool of processes, each process running one match at a
+time with both players driven by scripted input. Every match is seeded, so running the same match again gives the same result.
+
+Usage: python3 batch.py --matches 1000 --ticks 6000 --seed 0
+"""
+
+import os
+import json
+import time
+import random
+from argparse import ArgumentParser
+from multiprocessing import Pool
+
+from controller import RecordedInput, UP, LEFT, RIGHT, DOWN
+
+class RandomPilot:
+    """ Scripted input which holds a random set of actions for a number of ticks, then picks a new set. Iterating gives the action bitmask of every tick,
+    to be played by a RecordedInput.
+
+    Attributes
+    ----------
+    seed : int
+        Seed of the random actions.
+    hold : int
+        Number of ticks each set of actions is held.
+    """
+    def __init__(self, seed:int, hold=40):
+        """
+        Args
+        ----
+        seed : int
+            Seed of the random actions.
+        hold : int
+            Number of ticks each set of actions is held. (default 40)
+        """
+        self.seed = seed
+        self.hold = hold
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        while True:
+            held = sum(bit for bit in (UP, LEFT, RIGHT, DOWN) if rng.random() < 0.5)
+            for _ in range(self.hold):
+                yield held
+
+# Game of the worker process, made once per process by _init_worker and reused for every match.
+_game = None
+
+def _init_worker(map_file:str) -> None:
+    """ Make the headless game of a worker process. """
+    global _game
+
+    # SDL turns SIGTERM into a quit event, which a headless game never handles, so the pool could not stop its workers.
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+    from main import Main
+    _game = Main(headless=True, map_file=map_file)
+
+def run_match(seed:int, ticks:int) -> dict:
+    """ Simulate one match in the game of this process.
+
+    Args
+    ----
+    seed : int
+        Seed of the match. The pilots of player 1 and 2 are seeded with 2 * seed and 2 * seed + 1.
+    ticks : int
+        Number of ticks to simulate.
+
+    Returns
+    -------
+    result : dict
+        Seed, scores and stats of the match, see Scoreboard.
+    """
+
+    # Start from the same time as a new game, as reloading and animations depend on game time.
+    _game.t = 0
+    _game.new()
+    _game.controller1.source = RecordedInput(RandomPilot(2 * seed))
+    _game.controller2.source = RecordedInput(RandomPilot(2 * seed + 1))
+    _game.run(ticks)
+
+    return {"seed": seed, "scores": dict(_game.scoreboard.scores), "stats": {n: dict(s) for n, s in _game.scoreboard.stats.items()}}
+
+def _run_match(job:tuple) -> dict:
+    return run_match(*job)
+
+def summarize(results:list) -> dict:
+    """ Aggregate the results of matches.
+
+    Args
+    ----
+    results : list[dict]
+        Results of run_match.
+
+    Returns
+    -------
+    summary : dict
+        Number of matches and draws, and for each player the number of wins and the total and mean score, kills and wall deaths.
+    """
+    summary = {"matches": len(results), "draws": 0, "players": {}}
+
+    for player in ("1", "2"):
+        other = "2" if player == "1" else "1"
+        totals = {
+            "wins": sum(r["scores"][player] > r["scores"][other] for r in results),
+            "score": sum(r["scores"][player] for r in results),
+            "kills": sum(r["stats"][player]["kills"] for r in results),
+            "wall_deaths": sum(r["stats"][player]["wall_deaths"] for r in results),
+        }
+        for key in ("score", "kills", "wall_deaths"):
+            totals[f"mean_{key}"] = totals[key] / max(len(results), 1)
+        summary["players"][player] = totals
+
+    summary["draws"] = sum(r["scores"]["1"] == r["scores"]["2"] for r in results)
+    return summary
+
+def run_batch(matches:int, ticks:int, seed=0, map_file="testmap1.map", workers=None) -> list:
+    """ Simulate matches on a pool of processes.
+
+    Args
+    ----
+    matches : int
+        Number of matches.
+    ticks : int
+        Number of ticks per match.
+    seed : int
+        Seed of the first match, match i has seed + i. (default 0)
+    map_file : str
+        Map to play on. (default "testmap1.map")
+    workers : int|None
+        Number of processes. If None one per core. (default None)
+
+    Returns
+    -------
+    results : list[dict]
+        Results of run_match, ordered by seed.
+    """
+    jobs = [(seed + i, ticks) for i in range(matches)]
+    workers = workers or os.cpu_count() or 1
+
+    # Matches are independent, so they are handed out in small chunks and collected in any order.
+    with Pool(workers, initializer=_init_worker, initargs=(map_file,)) as pool:
+        results = list(pool.imap_unordered(_run_match, jobs, chunksize=max(1, matches // (8 * workers))))
+        pool.close()
+        pool.join()
+
+    return sorted(results, key=lambda result: result["seed"])
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Simulate many headless matches between scripted pilots.")
+    parser.add_argument("--matches", type=int, default=100, help="number of matches")
+    parser.add_argument("--ticks", type=int, default=6000, help="number of ticks per match")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first match")
+    parser.add_argument("--map", default="testmap1.map", help="map file to play on")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, one per core by default")
+    parser.add_argument("--json", default=None, help="write the results of every match to this file")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    results = run_batch(args.matches, args.ticks, args.seed, args.map, args.workers)
+    elapsed = time.perf_counter() - t0
+
+    summary = summarize(results)
+    print(json.dumps(summary, indent=4))
+    print(f"{args.matches} matches in {elapsed:.2f}s, {args.matches * args.ticks / elapsed:.0f} ticks per second")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=4)
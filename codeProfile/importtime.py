@@ -0,0 +1,56 @@
+""" Benchmark of how long it takes to import the game. Every statement is run in a fresh interpreter with -X importtime, and the median of the
+cumulative import time of the modules it imports is reported.
+
+Usage: python3 codeProfile/importtime.py [--runs N]
+"""
+
+import os
+import sys
+import subprocess
+from statistics import median
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    "import game_base_module",
+    "from game_base_module import GREEN",
+    "from game_base_module import Loop",
+    "from game_base_module import *",
+    "import main",
+]
+
+def import_time(statement:str) -> float:
+    """ Run statement in a new interpreter and return the time spent importing in seconds.
+
+    Args
+    ----
+    statement : str
+        Python statement importing something.
+
+    Returns
+    -------
+    seconds : float
+        Sum of the cumulative import times of the top-level imports of statement.
+    """
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+    # Lines look like "import time: self [us] | cumulative | imported package", nested imports are indented below their parent.
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total / 1e6
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measure the import time of the game.")
+    parser.add_argument("--runs", type=int, default=5, help="number of times each statement is run")
+    args = parser.parse_args()
+
+    for statement in STATEMENTS:
+        times = [import_time(statement) for _ in range(args.runs)]
+        print(f"{statement:<40} {median(times) * 1000:8.1f} ms")
@@ -9,6 +9,27 @@ BACKGROUND_COLOR = (100, 100, 100)
 TILESIZE = 32
 WIDTH, HEIGHT = TILESIZE * 48, TILESIZE * 28
 
+# Display settings. If DIRTY_RECTS is True only the parts of the display that changed are updated, unless a camera scrolled. The FPS in the window
+# caption is updated every CAPTION_INTERVAL seconds.
+DIRTY_RECTS = False
+CAPTION_INTERVAL = 0.5
+
+# Physics settings. The game is updated TICK_RATE times per second regardless of FPS, and at most MAX_SUBSTEPS times per drawn frame.
+TICK_RATE = 100
+MAX_SUBSTEPS = 5
+
+# Level streaming settings. The level is loaded in chunks of CHUNK_SIZE x CHUNK_SIZE tiles near the cameras, and chunks are unloaded when their
+# surfaces take more than CHUNK_MEMORY_BUDGET megabytes.
+CHUNK_SIZE = 16
+CHUNK_MEMORY_BUDGET = 64
+
+# Collision settings
+# If True collisions with walls are checked against one mask merged from all walls, otherwise against the walls on the tiles a sprite overlaps.
+MERGED_LEVEL_MASK = True
+
+# Symbols of the map tiles which are not walls, empty space and the starting points of the players. Rays cast over the map pass through them.
+EMPTY_TILES = ".12"
+
 NICE_COL = (255, 182, 193)
 
 # Sprite settings
@@ -16,5 +37,19 @@ SPRITE_FORCE = 400
 SPRITE_LOAD_DURATION = 0.2
 GRAVITY_MAG = 200
 
+# Texture loading settings. Textures are decoded by ASSET_WORKERS threads and cached packed into one atlas in ATLAS_CACHE, which is updated when a
+# texture changes.
+ATLAS_CACHE = ".cache/atlas.bin"
+ASSET_WORKERS = 4
+
+# Maximum number of rotated textures kept in the rotation cache.
+ROTATION_CACHE_SIZE = 1024
+
+# Maximum number of live smoke particles.
+SMOKE_CAPACITY = 16384
+
 # Projectile settings
 PROJECTILE_SPEED = 500
+
+# Number of dynamic bodies the physics world holds before its arrays grow.
+PHYSICS_CAPACITY = 256
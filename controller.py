@@ -1,80 +1,191 @@
-""" This module contains the Controller class which can be instantiated with a argument deciding what keys to use for controls of the respective player object. 
+""" This module contains the Controller class which can be instantiated with a argument deciding what keys to use for controls of the respective player object.
+
+The actions of a player each tick are a bitmask of UP, LEFT, RIGHT and DOWN, read from an input source: the keyboard (KeyboardInput), a recorded stream
+of bitmasks (RecordedInput) or a policy deciding from an observation of the game (PolicyInput). Only KeyboardInput uses pygame, so players driven by the
+other sources can be simulated without a display.
 
 TODO: Make a custom exception for when duplicate controls are registered.
 """
 
-import pygame as pg 
+import pygame as pg
+
+# Action bits
+UP = 1
+LEFT = 2
+RIGHT = 4
+DOWN = 8
+
+# Keys of the predefined controls, in the order UP, LEFT, RIGHT, DOWN.
+KEY_BINDINGS = {
+    "wasd": (pg.K_w, pg.K_a, pg.K_d, pg.K_s),
+    "arrows": (pg.K_UP, pg.K_LEFT, pg.K_RIGHT, pg.K_DOWN),
+}
+
+class KeyboardInput:
+    """ Input source reading the actions from the keys held on the keyboard.
+
+    Attributes
+    ----------
+    keys : tuple
+        The pygame.K_insert_key of UP, LEFT, RIGHT and DOWN.
+
+    Methods
+    -------
+    actions(observe)
+        Return the bitmask of the actions held.
+    """
+    def __init__(self, keys:tuple):
+        """
+        Args
+        ----
+        keys : tuple
+            The pygame.K_insert_key of UP, LEFT, RIGHT and DOWN.
+        """
+        self.keys = keys
+
+    def actions(self, observe) -> int:
+        """ Return the bitmask of the actions held.
+
+        Args
+        ----
+        observe : callable
+            Not used.
+
+        Returns
+        -------
+        actions : int
+            Bitmask of UP, LEFT, RIGHT and DOWN.
+        """
+        pressed = pg.key.get_pressed()
+        up, left, right, down = self.keys
+        return UP * pressed[up] | LEFT * pressed[left] | RIGHT * pressed[right] | DOWN * pressed[down]
+
+class RecordedInput:
+    """ Input source playing back a stream of actions, one bitmask per tick. When the stream runs out no actions are held.
+
+    Attributes
+    ----------
+    stream : iterator
+        Iterator over the bitmasks of the remaining ticks.
+
+    Methods
+    -------
+    actions(observe)
+        Return the bitmask of the next tick.
+    """
+    def __init__(self, stream):
+        """
+        Args
+        ----
+        stream : iterable[int]
+            Bitmasks of the actions of each tick, e.g. a list, bytes or a generator.
+        """
+        self.stream = iter(stream)
+
+    def actions(self, observe) -> int:
+        """ Return the bitmask of the next tick.
+
+        Args
+        ----
+        observe : callable
+            Not used.
+
+        Returns
+        -------
+        actions : int
+            Bitmask of UP, LEFT, RIGHT and DOWN.
+        """
+        return next(self.stream, 0)
+
+class PolicyInput:
+    """ Input source asking a policy, e.g. a bot, what to do given an observation of the game.
+
+    Attributes
+    ----------
+    policy : callable
+        Called with an observation every tick, returns the bitmask of the actions to hold.
+
+    Methods
+    -------
+    actions(observe)
+        Return the bitmask the policy decides on.
+    """
+    def __init__(self, policy):
+        """
+        Args
+        ----
+        policy : callable
+            Called with an observation every tick, see Player.observe, returns the bitmask of the actions to hold.
+        """
+        self.policy = policy
+
+    def actions(self, observe) -> int:
+        """ Return the bitmask the policy decides on.
+
+        Args
+        ----
+        observe : callable
+            Returns the observation of the controlled player.
+
+        Returns
+        -------
+        actions : int
+            Bitmask of UP, LEFT, RIGHT and DOWN.
+        """
+        return int(self.policy(observe()))
 
 class Controller:
-    """ Controller class which is passed to a player object to give that object controls. This class should be used to avoid multiple player objects having the same controls. 
-    
+    """ Controller class which is passed to a player object to give that object controls. This class should be used to avoid multiple player objects having the same controls.
+
     Attributes
     ----------
-    controller1, controller2 : dict, dict
-        Two separate predefined controller dicts where keys are the pygame.K_insert_key and items are what methods to use when key is pressed.
-    controllers : dict
-        Dictionary containing the avaliable controllers. Keys are a string of what keys to use and items are controller1 or controller2 attributes.
-    controls : dict
-        What controller is in use
-    
+    source : KeyboardInput|RecordedInput|PolicyInput
+        Where the actions come from.
+    actions : int
+        Bitmask of the actions of the latest tick.
+
     Methods
     -------
     register_keystrokes()
         Include in update() of object which has control over this controller to register what to do on keystrokes.
-    set_key_bindings(up, left, right, down)
+    set_key_bindings(up, left, right, down, observe)
         Register which functions to call when keys are pressed.
 
     TODO: Should add controller to a list of controllers in game object, then compare and ensure that controls are not duplicates
     """
-    def __init__(self, in_use="wasd"):
+    def __init__(self, in_use="wasd", source=None):
         """
         Args
         ----
         in_use : str
-            What controls to use. (default "wasd")
+            What keys to use if reading from the keyboard, "wasd" or "arrows". (default "wasd")
+        source : KeyboardInput|RecordedInput|PolicyInput|None
+            Where the actions come from. If None the keyboard with the keys of in_use. (default None)
         """
 
-        self.controller1 = {pg.K_w: self._up,
-                            pg.K_a: self._left,
-                            pg.K_d: self._right,
-                            pg.K_s: self._down}
-        self.controller2 = {pg.K_UP: self._up,
-                            pg.K_LEFT: self._left,
-                            pg.K_RIGHT: self._right,
-                            pg.K_DOWN: self._down}
-
-        self.controllers = {"wasd": self.controller1, "arrows": self.controller2}
-
-        self.controls = self.controllers[in_use]
+        self.source = source if source is not None else KeyboardInput(KEY_BINDINGS[in_use])
+        self.actions = 0
+        self.observe = lambda: None
 
     def register_keystrokes(self):
-        """ Method for registering when a predefined key is pressed and executing registered method of player class. Include this method in player's update(). """
-        key = pg.key.get_pressed()
+        """ Method for reading the actions of this tick from the source and executing registered methods of player class. Include this method in player's update(). """
+
+        actions = self.actions = self.source.actions(self.observe)
 
-        for defined_key in self.controls.keys():
-            if key[defined_key]:
-                self.controls[defined_key]()
+        if actions & UP:
+            self.up()
+        if actions & LEFT:
+            self.left()
+        if actions & RIGHT:
+            self.right()
+        if actions & DOWN:
+            self.down()
 
-    def set_key_bindings(self, up, left, right, down):
-        """ Method for setting what methods to call when register_keystrokes() register a keystroke. """
+    def set_key_bindings(self, up, left, right, down, observe=None):
+        """ Method for setting what methods to call when register_keystrokes() register a keystroke, and how to observe the controlled player. """
         self.up = up
         self.left = left
         self.right = right
         self.down = down
-    
-    def _up(self):
-        """ Method for calling up """
-        self.up()
-    
-    def _left(self):
-        """ Method for calling left """
-        self.left()
-    
-    def _right(self):
-        """ Method for calling right """
-        self.right()
-    
-    def _down(self):
-        """ Method for calling down """
-        self.down()
-    
\ No newline at end of file
+        if observe is not None:
+            self.observe = observe
@@ -1,105 +1,177 @@
 """ Module containing all visual effects which does not interact with any other sprites but are there only for the visuals (Except for LaserBeam but you get the point). """
 
 import pygame as pg
+import numpy as np
 vec = pg.math.Vector2
 
-from game_base_module import randvec, GREEN
 from config import *
+from textures import rotate_img
+from physics import Body
+from spatial import segment_hits_box
+
+class SmokeSystem:
+    """ Particle system for smoke. When particles are emitted in succession it appears as a cloud of smoke or exhaust. All particles are stored in fixed size
+    NumPy arrays and updated in one vectorized step per frame, instead of one sprite per particle.
+
+    Every particle follows the same course: it grows by d_scale_factor and fades by an alpha which decreases less and less each frame. Therefore the scale
+    and alpha of a particle only depend on its age in frames, and the images for every age are scaled and faded once up front in frames.
 
-class SmokeParticle(pg.sprite.Sprite):
-    """ SmokeParticle class which inherits from pygame.sprite.Sprite. When multiple SmokeParticles are created in succession it appears as a cloud of smoke or exhaust.
-    
     Note this class is GREATLY inspired by the code found in https://github.com/tank-king/Tutorials/tree/main/Python%20Pygame/smoke_effect.
 
     Attributes
     ----------
-    game : object
-        Main game object.
-    d_scale_factor : float
-        A factor to scale the image with. factor < 1 means image is scaled down, likewise factor > 1 means image is enlarged.
-    image : pygame.Surface
-        Image to be blitted to screen.
-    rect : pygame.Rect
-        Rectangle of image.
-    alpha : float
-        Transparency pixel value of image, 0 <= alpha <= 255. (default 128).
-    d_alpha : float
-        Rate of change in alpha. Think of it like the discrete time derivative of the alpha as this value is subtracted each iteration. (default 6)
-    vel : pygame.math.Vector2
-        Velocity of smoke particle.
-    pos : pygame.math.Vector2
-        Position of smoke particle.
+    capacity : int
+        Maximum number of live particles. When full, the oldest particle is replaced.
+    pos : numpy.ndarray
+        Positions of particles, shape (capacity, 2).
+    vel : numpy.ndarray
+        Velocities of particles, shape (capacity, 2).
+    age : numpy.ndarray
+        Number of frames each particle has lived, shape (capacity,).
+    alive : numpy.ndarray
+        True for slots holding a live particle, shape (capacity,).
+    scale : numpy.ndarray
+        Scale factor of the image per age.
+    alpha : numpy.ndarray
+        Transparency pixel value of the image per age, 0 <= alpha <= 255.
+    frames : list[pygame.Surface]
+        Pre-scaled and pre-faded image per age.
+    half_size : numpy.ndarray
+        Half the size of each image in frames, used to center the images.
 
     Methods
     -------
-    update(*args)
-        Update position, velocity, transparency and scale of image per frame. Also checks if smoke particle can be removed.
-    scale(img, factor)
+    emit(pos, vel)
+        Add a particle.
+    update(dt)
+        Update position and age of all particles and remove the ones that have faded out.
+    draw(surf, camera, shift=0)
+        Blit the particles visible to camera onto surf. Returns the changed areas of surf.
+    scale_img(img, factor)
         Scales the given image by given factor then returns scaled surface image.
     """
-    def __init__(self, game:object, pos:vec, vel:vec):
+    def __init__(self, img:pg.Surface, capacity=SMOKE_CAPACITY):
         """
         Args
         ----
-        game : object
-            Main game object.
+        img : pygame.Surface
+            Image of smoke.
+        capacity : int
+            Maximum number of live particles. (default SMOKE_CAPACITY)
+        """
+        self.capacity = capacity
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.age = np.zeros(capacity, dtype=int)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        # Slot of the next particle. Slots are used in a ring, and as all particles live equally long the next slot is always the oldest one.
+        self._next = 0
+
+        self._build_frames(img)
+
+    def _build_frames(self, img:pg.Surface) -> None:
+        """ Calculate scale and alpha for each frame of the lifetime of a particle, and make the image for each frame.
+
+        Args
+        ----
+        img : pygame.Surface
+            Image of smoke.
+        """
+
+        # Starting image is large, therefore it is already scaled down by 0.1. The scale then grows by 0.005 each frame.
+        # Alpha starts at 128 and decreases by d_alpha, which itself decreases by 0.1 each frame until it is 1.5. The particle is gone when alpha is negative.
+        scales, alphas = [], []
+        scale, alpha, d_alpha = 0.1, 128, 6
+
+        while alpha >= 0:
+            scales.append(scale)
+            alphas.append(alpha)
+            scale += 0.005
+            alpha -= d_alpha
+            d_alpha = max(d_alpha - 0.1, 1.5)
+
+        self.scale = np.array(scales)
+        self.alpha = np.array(alphas)
+        self.frames = []
+
+        for scale, alpha in zip(self.scale, self.alpha):
+            frame = self.scale_img(img, scale)
+            frame.set_alpha(int(alpha))
+            self.frames.append(frame)
+
+        self.half_size = np.array([frame.get_size() for frame in self.frames]) // 2
+        self.lifetime = len(self.frames)
+
+    def emit(self, pos:vec, vel:vec) -> None:
+        """ Add a particle. If all slots are in use the oldest particle is replaced.
+
+        Args
+        ----
         pos : pygame.math.Vector2
-            Starting position of SmokeParticle.
+            Starting position of particle.
         vel : pygame.math.Vector2
-            Starting velocity of SmokeParticle.
+            Direction of particle, the speed is 400 in this direction.
         """
-        super().__init__(game.all_sprites)
-        self.game = game
-        self.d_scale_factor = 0.1
-        
-        # Starting image is large, therefore we already scale it down to d_scale_factor.
-        self.image = self.scale(game.smoke_img, self.d_scale_factor)
-        self.rect = self.image.get_rect(center=pos)
+        i = self._next
+        self.pos[i] = pos
+        self.vel[i] = vel * 400
+        self.age[i] = 0
+        self.alive[i] = True
+        self._next = (i + 1) % self.capacity
 
-        self.alpha = 128
-        self.d_alpha = 6
-        self.vel = vel * 400
-        self.pos = pos
+    def update(self, dt:float) -> None:
+        """ Update position and age of all particles and remove the ones that have faded out.
 
-    def update(self, *args):
-        """ Update position, velocity, transparency and scale of image per frame. Also checks if smoke particle can be removed.
-        
         Args
         ----
-        *args : any
-            -
+        dt : float
+            Time step in seconds.
         """
 
-        # Using Euler cromer method to update position based on velocity
-        self.pos += self.vel * self.game.dt
+        # Using Euler cromer method to update position based on velocity. Dead slots are moved too, which is cheaper than selecting the live ones.
+        self.pos += self.vel * dt
+        self.age += 1
 
-        # Set rectangle position to pos vector.
-        self.rect.center = self.pos
+        # Remove particles which are completely invisible.
+        self.alive &= self.age < self.lifetime
 
-        # change in d_scale_factor. Sort of like a derivative of the scale factor at 0.005. Therefore image is enlarged by this factor each frame.
-        self.d_scale_factor += 0.005
+    def draw(self, surf:pg.Surface, camera, shift=0) -> list[pg.Rect]:
+        """ Blit the particles visible to camera onto surf.
 
-        # update alpha based on change in alpha. (apply derivative)
-        self.alpha -= self.d_alpha
+        Args
+        ----
+        surf : pygame.Surface
+            Surface to blit to, typically the surface of a Screen.
+        camera : Camera
+            Camera deciding what part of the level is visible.
+        shift : float
+            Time in seconds to move particles along their velocity before drawing, negative to draw them where they were before the latest update. (default 0)
 
-        # Kill sprite if completely invisible.
-        if self.alpha < 0:
-            self.alive = False
-            self.game.all_sprites.remove(self)
+        Returns
+        -------
+        rects : list[pygame.Rect]
+            The areas of surf which were blitted to.
+        """
+        slots = np.flatnonzero(self.alive)
+        age = self.age[slots]
+        half_size = self.half_size[age]
+        pos = self.pos[slots] + self.vel[slots] * shift if shift else self.pos[slots]
+        topleft = pos.astype(int) - half_size
 
-        # Change the change in alpha by this factor. Therefore here we apply a sort of second derivative to the change in alpha.
-        self.d_alpha -= 0.1
+        # Cull the particles outside the view of the camera.
+        view = camera.view
+        visible = np.all((topleft < view.bottomright) & (topleft + 2 * half_size > view.topleft), axis=1)
 
-        # Set change in alpha to constant if value is too small.
-        if self.d_alpha < 1.5:
-            self.d_alpha = 1.5
-        
-        # Scale and set alpha of image.
-        self.image = self.scale(self.game.smoke_img, self.d_scale_factor)
-        self.image.set_alpha(self.alpha)
+        topleft = (topleft[visible] - view.topleft).tolist()
+        frames = self.frames
+        return surf.blits([(frames[a], xy) for a, xy in zip(age[visible].tolist(), topleft)])
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.alive))
 
     @staticmethod
-    def scale(img: pg.Surface, factor:float) -> pg.Surface:
+    def scale_img(img: pg.Surface, factor:float) -> pg.Surface:
         """ Scales the given image by given factor then returns scaled surface image. 
         
         Args
@@ -142,8 +214,12 @@ class Explotion(pg.sprite.Sprite):
     
     Methods
     -------
+    reset(game, pos)
+        Start the explotion over at pos, to reuse it from the games SpritePool.
     update(*args)
         Method for updating each image to use in animation. Also kills sprite and removes object from all sprite groups.
+    kill()
+        Removes sprite from all groups and puts it back in the games pool.
     _frame_step()
         Method that changes the frame if a certain amount of time has passed (0.1s). Therefore the explotion lasts for a total of 0.1 * len(images) seconds.
     """
@@ -156,16 +232,23 @@ class Explotion(pg.sprite.Sprite):
         pos : pygame.math.Vector2
             The position where the explotion is to take place.
         """
-        super().__init__(game.all_sprites)
-        self.images = game.explotion_img
+        super().__init__()
+        self.images = [asset.get() for asset in game.explotion_img]
+        self.rect = self.images[0].get_rect()
+        self.reset(game, pos)
+
+    def reset(self, game:object, pos:vec) -> None:
+        """ Start the explotion over at pos. Takes the same arguments as Explotion(). """
+        self.add(game.all_sprites)
 
         # initially use first image.
         self.image = self.images[0]
-        self.rect = self.image.get_rect(center=pos)
+        self.rect.size = self.image.get_size()
+        self.rect.center = pos
         self.game = game
 
-        # find starting time of explotion.
-        self.prev_frame_t = pg.time.get_ticks() / 1000
+        # find starting time of explotion in game time.
+        self.prev_frame_t = game.t
 
         # set current frame to 0.
         self.frame = 0
@@ -179,7 +262,8 @@ class Explotion(pg.sprite.Sprite):
         """
 
         # increase frame by output of _frame_step.
-        self.frame += self._frame_step()
+        step = self._frame_step()
+        self.frame += step
 
         # kill explotion if frame is the last frame.
         if self.frame == len(self.images) - 1:
@@ -191,28 +275,43 @@ class Explotion(pg.sprite.Sprite):
         # recenter image
         self.rect = self.image.get_rect(center = self.rect.center)
 
+        # The frames differ in size, so a new frame may cover other cells of the sprite hash.
+        if step:
+            self.game.sprite_hash.touch(self)
+
+    def kill(self):
+        """ Removes sprite from all groups and puts it back in the games pool. """
+        if not self.alive():
+            return
+        super().kill()
+        self.game.explotion_pool.release(self)
+
     def _frame_step(self):
         """ Method that changes the frame if a certain amount of time has passed (0.1s). Therefore the explotion lasts for a total of 0.1 * len(images) seconds. """
 
         # Calculate time between frames. If time exceeds 0.1 s, change frame.
-        if pg.time.get_ticks() / 1000 - self.prev_frame_t > 0.1:
-            self.prev_frame_t = pg.time.get_ticks() / 1000
+        if self.game.t - self.prev_frame_t > 0.1:
+            self.prev_frame_t = self.game.t
             return 1
 
         return 0
 
-class LaserBeam(pg.sprite.Sprite):
-    """ Class LaserBeam which inherits from pygame.sprite.Sprite. A laser shot from the top of a spacecraft. If collision with wall - kill laser,
-    if collision with player, kill player. 
+class LaserBeam(Body, pg.sprite.Sprite):
+    """ Class LaserBeam which inherits from Body and pygame.sprite.Sprite. A laser shot from the top of a spacecraft. If collision with wall - kill laser,
+    if collision with player, kill player. The laser is moved by the physics world of the game.
     
     Attributes
     ----------
     game : object
         Main game object.
     sender : Player
-        The sender of the laser beam. Used to not collide with the one who shot the laser.
+        The sender of the laser beam.
+    owner : int
+        Player number of the sender. Used to not collide with the one who shot the laser, also after it respawned.
     pos : pygame.math.Vector2
         The position of the LaserBeam
+    prev_pos : pygame.math.Vector2
+        The position before the latest update. Used to interpolate when drawing.
     dir : int
         The direction the LaserBeam is traveling.
     image : pygame.Surface
@@ -223,13 +322,19 @@ class LaserBeam(pg.sprite.Sprite):
         Mask of image.
     vel : pygame.math.Vector2
         Velocity of object.
+    half_length : float
+        Half the length of the visible beam.
 
     Methods
     -------
-    update(*args)
-        update position and check for collisions.
+    reset(sender, game, pos, direction)
+        Fire the laser again, to reuse it from the games SpritePool.
+    kill()
+        Removes sprite from all groups and its body from the physics world, and puts it back in the games pool.
+    after_step(walls)
+        update rect and check for collisions after the physics world has moved the laser.
     _collide()
-        check for collision with walls.
+        check for collision with walls and players along the path of the laser.
     rotate_img(img, angle)
         Method to rotate the image given a image and an angle.
     """
@@ -251,36 +356,63 @@ class LaserBeam(pg.sprite.Sprite):
         direction : int
             The starting direction the LaserBeam is traveling.
         """
-        
+        super().__init__()
+        self.reset(sender, game, pos, direction)
+
+    def reset(self, sender:object, game:object, pos:vec, direction:int) -> None:
+        """ Fire the laser again. Takes the same arguments as LaserBeam(). """
         self.game = game
         self.sender = sender
-        super().__init__(game.all_sprites, game.all_projectiles)
-        self.pos = pos
+        self.owner = sender.player_n
+        self.add(game.all_sprites, game.all_projectiles, game.all_bodies)
         self.dir = direction
-        self.image = self.game.laser_img
         
-        # Set correct rotation of image rect and mask as well as velocity.
-        self.image, self.rect, self.mask = self.rotate_img(self.image, -self.dir)
-        self.vel = vec(0, -PROJECTILE_SPEED).rotate(self.dir)
+        # Set correct rotation of image rect and mask from the games rotation cache, and give the laser a body moving at PROJECTILE_SPEED.
+        self.image, self.rect, self.mask = self.game.rotations.get(self.game.laser_img.get(), -self.dir)
+        self.add_body(game.physics, pos, vec(0, -PROJECTILE_SPEED).rotate(self.dir))
+        self.half_length = self.game.laser_img.get().get_bounding_rect().height / 2
+        self._reach = self.vel.normalize() * self.half_length
+
+    def kill(self):
+        """ Removes sprite from all groups and its body from the physics world, and puts it back in the games pool. """
+        if not self.alive():
+            return
+        super().kill()
+        self.game.laser_pool.release(self)
+
+    def after_step(self, walls):
+        """ update rect and check for collisions.
 
-    def update(self, *args):
-        """ update position and check for collisions.
         Args
         ----
-        *args : any
-            -
+        walls : TileGrid|LevelMask
+            Collision index containing all walls.
         """
-        self.pos += self.vel * self.game.dt
-        self.rect.center = self.pos
+        self.sync_rect()
         self._collide()
 
     def _collide(self):
-        """ Method to rotate the image given a image and an angle. """
-        for wall in self.game.all_walls:
-
-            # check if masks overlap.
-            if pg.sprite.collide_mask(self, wall):
-                self.kill()
+        """ Check for collision with walls and players. Rather than checking for overlap where the laser ended up, the beam is swept along its path this
+        tick, from its tail before to its tip after the step. Therefore it hits thin walls and players however far it moves per tick. """
+
+        start, end = self.prev_pos - self._reach, self.pos + self._reach
+
+        # Find the first wall on the path, landing pads included. Players behind the wall are not hit.
+        hit = self.game.tile_grid.cast(start, end)
+        if hit is not None:
+            end = start.lerp(end, hit[3])
+
+        # Each laser has an owner so that it does not hit the player who shot it. The rect of a player contains it at any rotation, so only players whose
+        # rect overlaps the bounding box of the path need the exact test.
+        area = pg.Rect(min(start[0], end[0]), min(start[1], end[1]), abs(end[0] - start[0]) + 1, abs(end[1] - start[1]) + 1)
+        for player in self.game.all_players.sprites():
+            if player.player_n != self.owner and area.colliderect(player.rect) and segment_hits_box(start, end, player.pos, player.half_size, player.rot):
+                player.kill(reason="shot")
+
+        # Lasers which have left the level can not hit anything anymore.
+        x, y = end
+        if hit is not None or not (0 <= x < self.game.map.width and 0 <= y < self.game.map.height):
+            self.kill()
 
     @staticmethod
     def rotate_img(img:pg.Surface, angle:int) -> tuple[pg.Surface, pg.Rect, pg.mask.Mask]:
@@ -302,11 +434,6 @@ class LaserBeam(pg.sprite.Sprite):
         new_mask : pygame.mask.Mask
         """
 
-        old_center = img.get_rect().center
-        rot_img = pg.transform.rotate(img, angle)
-        rot_img.set_colorkey(GREEN)
-        new_rect = rot_img.get_rect(center=old_center)
-        new_mask = pg.mask.from_surface(rot_img)
-        return rot_img, new_rect, new_mask
+        return rotate_img(img, angle)
 
 
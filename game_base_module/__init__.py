@@ -1,13 +1,34 @@
 """ 
 Imports and making game_base_module into python module
+
+Submodules are imported the first time one of their names is used (PEP 562), so importing the package, e.g. for its settings, does not import pygame.
 """
-from .loop import Loop
-from .menu import Menu
-from .interactives import Interactives, HealthBar, TextBox, Slider, Button
-from .text import draw_text
-from .util import randcol, collide, percent, map_val, randvec
+from importlib import import_module
+
+from . import settings as _settings
 from .settings import *
-from .vector import intersect_rectangle_circle
-from .event_handler import EventDispatcher, EventHandler, DuplicateHandlerError
 
-# __all__ = ["Loop", "Menu", "Interactives", "HealthBar", "TextBox", "Slider", "Button", "draw_text", "randcol", "collide", "percent", "map_val", "randvec", "intersect_rectangle_circle", "EventDispatcher", "EventHandler", "DuplicateHandlerError"]
+# Public names of the submodules, imported on first use.
+_LAZY = {
+	"Loop": ".loop",
+	"FrameProfiler": ".profiler",
+	"Menu": ".menu",
+	"Interactives": ".interactives", "HealthBar": ".interactives", "TextBox": ".interactives", "Slider": ".interactives", "Button": ".interactives",
+	"draw_text": ".text", "render_text": ".text", "get_font": ".text",
+	"randcol": ".util", "collide": ".util", "percent": ".util", "map_val": ".util", "randvec": ".util",
+	"intersect_rectangle_circle": ".vector",
+	"EventDispatcher": ".event_handler", "EventHandler": ".event_handler", "DuplicateHandlerError": ".event_handler",
+}
+
+# "from game_base_module import *" still gives every name, which imports all submodules. Import names explicitly to only import what is used.
+__all__ = [name for name in vars(_settings) if not name.startswith("_")] + list(_LAZY)
+
+def __getattr__(name):
+	if name not in _LAZY:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	value = getattr(import_module(_LAZY[name], __name__), name)
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return sorted(set(globals()) | set(_LAZY))
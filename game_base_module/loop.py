@@ -1,8 +1,7 @@
+import os
 import pygame as pg
 from .event_handler import EventDispatcher, EventHandler, DuplicateHandlerError
-
-# pygame init
-pg.init()
+from .profiler import FrameProfiler
 
 class Loop:
     """ Base object for simple creation of game loops.
@@ -13,14 +12,28 @@ class Loop:
         Measurements of main display
     fps : int
         Target Frames Per Second of loop.
+    tick_rate : int
+        Number of updates per second. The game is updated in fixed time steps of 1 / tick_rate, independently of the frame rate. (Default fps)
+    max_substeps : int
+        Maximum number of updates per frame. If the loop falls further behind, the remaining time is dropped instead of catching up. (Default 5)
+    headless : bool
+        If True there is no display. The loop runs one update per frame as fast as possible and nothing is drawn. (Default False)
     screen : pg.Surface
-        Main screen.
+        Main screen. When headless this is a plain surface which is never shown.
     clock : pygame.time.Clock
         Clock for synchronizing all in-game events and sprite movement.
     all_interactives : list
         List to keep track of interactives, like buttons, sliders and such if any.
     t : float
         Time since main loop start. (Default 0)
+    dt : float
+        Time step of an update, always 1 / tick_rate.
+    alpha : float
+        How far the current frame is between the previous and the latest update, 0 <= alpha < 1. Used to interpolate positions when drawing.
+    step_count : int
+        Number of updates since the loop started. (Default 0)
+    profiler : FrameProfiler
+        Times event handling, update and draw of every frame, and nested sections of them. Times nothing unless profiling. F3 toggles its overlay.
     dispatcher : EventDispatcher
         Dispatches events to EventHandler's when events occur.
     quit_handler : EventHandler
@@ -32,12 +45,16 @@ class Loop:
         Loads data when instanced.
     new()
         Starts a new game by instantiating all objects again.
-    run()
+    run(ticks=None, steps=None)
         Continouously runs and checks for events and updates sprites and game logic as well as drawing sprites and background.
     update()
         Update all groups.
     draw()
         Draw all groups.
+    present(rects)
+        Show what has been drawn on the display.
+    redraw()
+        Draw and show the whole screen on the next frame.
     quit()
         Quit game.
     event_handling()
@@ -45,7 +62,7 @@ class Loop:
     keypress_handler(event)
         Handles keypresses and is attached to an EventHandler.
     """
-    def __init__(self, width, height, fps):
+    def __init__(self, width, height, fps, headless=False, tick_rate=None, max_substeps=5, profile=False):
         """
         Args
         ----
@@ -55,11 +72,31 @@ class Loop:
             Screen height.
         fps : int
             Target fps.
+        headless : bool
+            Run without a display. (default False)
+        tick_rate : int|None
+            Updates per second. If None the same as fps. (default None)
+        max_substeps : int
+            Maximum number of updates per frame. (default 5)
+        profile : bool
+            Time the sections of every frame and show the overlay of the profiler. (default False)
         """
         self.width, self.height = width, height
         self.fps = fps
-        
-        self.screen = pg.display.set_mode((self.width, self.height))
+        self.tick_rate = tick_rate or fps
+        self.max_substeps = max_substeps
+        self.headless = headless
+
+        if headless:
+            # Keyboard state and surfaces still need the video system, use the dummy driver if there is no display to initialize.
+            if not pg.display.get_init():
+                os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+                pg.display.init()
+            self.screen = pg.Surface((self.width, self.height))
+        else:
+            # Only the display is initialized, not every pygame subsystem. Fonts are initialized when text is first drawn, and the timer by the clock.
+            pg.display.init()
+            self.screen = pg.display.set_mode((self.width, self.height))
 
         # set up a game clock
         self.clock = pg.time.Clock()
@@ -70,8 +107,15 @@ class Loop:
         # load data
         self.load_data()
         
-        # timer
+        # timer, fixed time step and the time not yet simulated
         self.t = 0
+        self.dt = 1 / self.tick_rate
+        self.alpha = 0
+        self.step_count = 0
+        self._accumulator = 0
+
+        # frame profiler, the overlay is only drawn if there is a display
+        self.profiler = FrameProfiler(enabled=profile, overlay=profile and not headless)
 
         # setting up a event handling dispatcher
         self.dispatcher = EventDispatcher()
@@ -89,23 +133,90 @@ class Loop:
         """ Starts a new game with a new counter, level 1, all obstacles, music and ball """
         pass
 
-    def run(self):
-        """ Continouously runs and checks for events and updates sprites and game logic as well as drawing sprites and background. """
+    def run(self, ticks=None, steps=None):
+        """ Continouously runs and checks for events and updates sprites and game logic as well as drawing sprites and background.
+        
+        Args
+        ----
+        ticks : int|None
+            Stop after this many frames. If None run until quit. (default None)
+        steps : int|None
+            Stop after this many updates, even in the middle of a frame. If None run until quit. (default None)
+        """
         self.playing = True
-        while self.playing:
-            self.dt = self.clock.tick(self.fps) / 1000
-            self.event_handling()
-            self.update()
-            self.draw()
-            pg.display.flip()
-            self.t += self.dt
+        tick = 0
+        end = self.step_count + steps if steps is not None else None
+        profiler = self.profiler
+        while self.playing and (ticks is None or tick < ticks) and (end is None or self.step_count < end):
+            if self.headless:
+                # One update per frame and no frame cap, the clock only measures how fast we go.
+                self.clock.tick()
+                with profiler.section("frame"), profiler.section("update"):
+                    self._step()
+            else:
+                # The frame is timed after waiting for the frame cap, so it only covers the work done.
+                self._accumulator += self.clock.tick(self.fps) / 1000
+                with profiler.section("frame"):
+                    with profiler.section("events"):
+                        self.event_handling()
+
+                    # Run as many fixed updates as the time since the last frame covers.
+                    with profiler.section("update"):
+                        substeps = 0
+                        while self._accumulator >= self.dt and substeps < self.max_substeps and (end is None or self.step_count < end):
+                            self._step()
+                            self._accumulator -= self.dt
+                            substeps += 1
+
+                    # If we could not catch up, drop the time we are behind instead of trying to catch up the next frame, which would only make us fall further behind.
+                    if self._accumulator >= self.dt:
+                        self._accumulator %= self.dt
+
+                    self.alpha = self._accumulator / self.dt
+                    with profiler.section("draw"):
+                        rects = self.draw()
+
+                        # The overlay is drawn last, on top of everything in the top right corner, and its area is updated with the rest.
+                        if profiler.overlay:
+                            area = profiler.draw(self.screen, self.width, 0, "topright")
+                            if rects is not None:
+                                rects.append(area)
+
+                        with profiler.section("draw/flip"):
+                            self.present(rects)
+            profiler.end_frame()
+            tick += 1
+
+    def _step(self):
+        """ Update once with the fixed time step. """
+        self.update()
+        self.t += self.dt
+        self.step_count += 1
 
     def update(self):
-        """ Update once every frame. """
+        """ Update once every time step of 1 / tick_rate seconds. """
         pass
 
     def draw(self):
-        """ Draws once every frame. """
+        """ Draws once every frame. May return a list of the rects on the screen which changed, see present. """
+        pass
+
+    def present(self, rects=None):
+        """ Show what has been drawn on the display.
+
+        Args
+        ----
+        rects : list[pygame.Rect]|None
+            Only update these parts of the display. If None the whole display is updated. (default None)
+        """
+        if rects is None:
+            pg.display.flip()
+        else:
+            pg.display.update(rects)
+
+    def redraw(self):
+        """ Draw and show the whole screen on the next frame, e.g. after something drawn on top of it is hidden. Games whose draw() only updates the
+        parts of the screen which changed should override this. """
         pass
 
     def quit(self):
@@ -129,6 +240,12 @@ class Loop:
         """ Handles keypresses and is attached to an EventHandler. """
 
         key_input = pg.key.get_pressed()
+        if key_input[pg.K_F3] and self.profiler.enabled:
+            self.profiler.overlay = not self.profiler.overlay
+
+            # A hidden overlay is no longer drawn over, so redraw the screen underneath it.
+            if not self.profiler.overlay:
+                self.redraw()
         if key_input[pg.K_ESCAPE]:
             self.quit()
         if key_input[pg.K_q]:
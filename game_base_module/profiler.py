@@ -0,0 +1,235 @@
+""" Frame profiler timing the sections of every frame of a Loop, e.g. event handling, update and draw, and keeping rolling percentiles of them.
+
+Sections are named by their path, nested sections below their parent, e.g. "update/physics" is part of "update". A section may be entered several
+times per frame, e.g. once per update when a frame runs several updates, and the times add up.
+
+    with profiler.section("update/physics"):
+        world.step(dt)
+"""
+
+import csv
+import json
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+
+import pygame as pg
+from .settings import WHITE, BLACK
+from .text import render_text
+
+# Number of frames kept for the percentiles, the percentiles shown and exported, and how often the overlay is rendered again in seconds.
+PROFILE_WINDOW = 300
+PROFILE_PERCENTILES = (50, 95, 99)
+OVERLAY_INTERVAL = 0.5
+OVERLAY_TEXT_SIZE = 14
+
+# Context manager of every section of a disabled profiler, doing nothing.
+_NO_TIMER = nullcontext()
+
+def _percentile(values:list, q:float) -> float:
+	""" Percentile q of sorted values, interpolated linearly between the closest ranks. """
+	rank = (len(values) - 1) * q / 100
+	low = int(rank)
+	high = min(low + 1, len(values) - 1)
+	return values[low] + (values[high] - values[low]) * (rank - low)
+
+class _Timer:
+	""" Context manager adding the time spent inside it to the time of a section in the current frame. """
+	__slots__ = ("totals", "name", "start")
+
+	def __init__(self, totals:dict, name:str):
+		self.totals = totals
+		self.name = name
+		self.start = 0
+
+	def __enter__(self):
+		self.start = perf_counter()
+
+	def __exit__(self, *exc):
+		self.totals[self.name] += perf_counter() - self.start
+
+class FrameProfiler:
+	""" Times named sections of every frame and keeps the times of the last frames to give rolling percentiles. A disabled profiler times nothing, so
+	sections cost next to nothing when not profiling.
+
+	Attributes
+	----------
+	enabled : bool
+		If False sections are not timed.
+	overlay : bool
+		If True the Loop draws the percentiles on top of the screen every frame.
+	frames : int
+		Number of frames ended.
+	samples : dict
+		Times in seconds of each section in the last window frames, in the order the sections were first entered.
+
+	Methods
+	-------
+	section(name)
+		Context manager timing a section of the current frame.
+	end_frame()
+		Store the times of the current frame and start the next.
+	summary()
+		Mean, percentiles and maximum of each section in milliseconds.
+	report()
+		Summary as a text table.
+	draw(surf, x=0, y=0, anchor="topleft")
+		Draw the summary on a surface.
+	export(path)
+		Write the times of the last frames to a .csv file, or the summary to a .json file.
+	"""
+	def __init__(self, enabled=True, window=PROFILE_WINDOW, overlay=False):
+		"""
+		Args
+		----
+		enabled : bool
+			Time sections. (default True)
+		window : int
+			Number of frames kept for the percentiles. (default PROFILE_WINDOW)
+		overlay : bool
+			Draw the percentiles on top of the screen. (default False)
+		"""
+		self.enabled = enabled
+		self.overlay = overlay
+		self.window = window
+		self.frames = 0
+		self.samples = {}
+
+		# Time of each section in the current frame, the timers adding to it, and the frame number of every sample.
+		self._totals = {}
+		self._timers = {}
+		self._frame_numbers = deque(maxlen=window)
+
+		# The overlay is rendered to a surface every OVERLAY_INTERVAL seconds and blitted in between, as rendering text every frame is slow.
+		self._overlay_surf = None
+		self._overlay_t = -OVERLAY_INTERVAL
+
+	def section(self, name:str):
+		""" Context manager timing a section of the current frame.
+
+		Args
+		----
+		name : str
+			Path of the section, e.g. "update/physics".
+
+		Returns
+		-------
+		timer : context manager
+			Adds the time spent inside it to the section.
+		"""
+		if not self.enabled:
+			return _NO_TIMER
+		timer = self._timers.get(name)
+		if timer is None:
+			# Frames before the section was first entered did not spend time in it.
+			self._totals[name] = 0
+			self.samples[name] = deque([0] * len(self._frame_numbers), maxlen=self.window)
+			timer = self._timers[name] = _Timer(self._totals, name)
+		return timer
+
+	def end_frame(self) -> None:
+		""" Store the times of the current frame and start the next. """
+		if not self.enabled:
+			return
+		totals = self._totals
+		for name, samples in self.samples.items():
+			samples.append(totals[name])
+			totals[name] = 0
+		self._frame_numbers.append(self.frames)
+		self.frames += 1
+
+	def summary(self) -> dict:
+		""" Mean, percentiles and maximum of each section over the last frames.
+
+		Returns
+		-------
+		summary : dict
+			For each section a dict of "mean", "p50", "p95", "p99" and "max", in milliseconds.
+		"""
+		summary = {}
+		for name, samples in self.samples.items():
+			if not samples:
+				continue
+			values = sorted(samples)
+			stats = {"mean": 1000 * sum(values) / len(values)}
+			for q in PROFILE_PERCENTILES:
+				stats[f"p{q}"] = 1000 * _percentile(values, q)
+			stats["max"] = 1000 * values[-1]
+			summary[name] = stats
+		return summary
+
+	def _rows(self) -> list:
+		""" Rows of the text table of the summary, nested sections indented below their parent. """
+		columns = ["mean"] + [f"p{q}" for q in PROFILE_PERCENTILES] + ["max"]
+		rows = [["ms"] + columns]
+		for name, stats in self.summary().items():
+			depth = name.count("/")
+			rows.append(["  " * depth + name.rsplit("/", 1)[-1]] + [f"{stats[column]:.2f}" for column in columns])
+		return rows
+
+	def report(self) -> str:
+		""" Summary as a text table, one line per section. """
+		rows = self._rows()
+		width = max(len(row[0]) for row in rows)
+		return "\n".join(f"{row[0]:<{width}}" + "".join(f"{cell:>9}" for cell in row[1:]) for row in rows)
+
+	def draw(self, surf:pg.Surface, x=0, y=0, anchor="topleft") -> pg.Rect:
+		""" Draw the summary on a surface, on an opaque background.
+
+		Args
+		----
+		surf : pygame.Surface
+			Surface to draw on.
+		x, y : int, int
+			Position of the table. (default 0, 0)
+		anchor : str
+			Point of the table placed at x, y, a pygame.Rect attribute like "topleft" or "topright". (default "topleft")
+
+		Returns
+		-------
+		rect : pygame.Rect
+			Area of surf drawn on.
+		"""
+		now = perf_counter()
+		if self._overlay_surf is None or now - self._overlay_t >= OVERLAY_INTERVAL:
+			self._overlay_surf = self._render()
+			self._overlay_t = now
+		return surf.blit(self._overlay_surf, self._overlay_surf.get_rect(**{anchor: (x, y)}))
+
+	def _render(self) -> pg.Surface:
+		""" Render the text table of the summary, the first column left aligned and the others right aligned. """
+		rows = [[render_text(cell, OVERLAY_TEXT_SIZE, WHITE) for cell in row] for row in self._rows()]
+		line = max(text.get_height() for row in rows for text in row)
+		first = max(row[0].get_width() for row in rows) + OVERLAY_TEXT_SIZE
+		column = max(text.get_width() for row in rows for text in row[1:]) + OVERLAY_TEXT_SIZE
+		padding = OVERLAY_TEXT_SIZE // 2
+
+		surf = pg.Surface((2 * padding + first + column * (len(rows[0]) - 1), 2 * padding + line * len(rows)))
+		surf.fill(BLACK)
+		for i, row in enumerate(rows):
+			top = padding + i * line
+			surf.blit(row[0], (padding, top))
+			for j, text in enumerate(row[1:]):
+				surf.blit(text, (padding + first + (j + 1) * column - text.get_width(), top))
+		return surf
+
+	def export(self, path:str) -> None:
+		""" Write the times of the last frames in milliseconds to a .csv file, one row per frame and one column per section, or the summary to a .json
+		file.
+
+		Args
+		----
+		path : str
+			Path to file, ending with .csv or .json.
+		"""
+		if path.endswith(".csv"):
+			with open(path, "w", newline="") as f:
+				writer = csv.writer(f)
+				writer.writerow(["frame_number"] + list(self.samples))
+				for i, frame in enumerate(self._frame_numbers):
+					writer.writerow([frame] + [f"{1000 * samples[i]:.4f}" for samples in self.samples.values()])
+		elif path.endswith(".json"):
+			with open(path, "w") as f:
+				json.dump({"frames": self.frames, "window": len(self._frame_numbers), "sections": self.summary()}, f, indent=4)
+		else:
+			raise ValueError(f"Can not export profile to {path}, the file must end with .csv or .json")
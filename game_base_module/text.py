@@ -1,14 +1,34 @@
+from functools import lru_cache
+
 import pygame as pg
 vec = pg.math.Vector2
 
-pg.font.init()
+# None means the default font, which is looked up the first time text is drawn as looking up system fonts is slow.
+FONT_TYPE = None
+
+# Number of rendered text surfaces to keep in render_text's cache.
+TEXT_CACHE_SIZE = 256
+
+@lru_cache(maxsize=None)
+def default_font():
+	""" Path to the default font, or None if it is not installed, in which case pygame uses its own font. """
+	return pg.font.match_font('freesansbold.ttf')
+
+@lru_cache(maxsize=None)
+def get_font(font_name, size):
+	""" Font of given name and size. Fonts are loaded once and then shared. The font module is initialized the first time a font is needed. """
+	if not pg.font.get_init():
+		pg.font.init()
+	return pg.font.Font(font_name if font_name is not None else default_font(), size)
 
-FONT_TYPE = pg.font.match_font('freesansbold.ttf')
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text, size, color, font_name=FONT_TYPE):
+	""" Rendered surface of text. The least recently used surfaces are dropped when the cache is full. The surface is shared and must not be modified. """
+	return get_font(font_name, size).render(text, True, color)
 
 def draw_text(surf, text, size, x, y, color, center=False, font_name=FONT_TYPE):
-	font = pg.font.Font(font_name, size)
-	text_surface = font.render(text, True, color)
+	text_surface = render_text(text, size, tuple(color), font_name)
 	text_rect = text_surface.get_rect() if not center else text_surface.get_rect(center=vec(x, y))
 	if not center:
 		text_rect = vec(x, y)
-	surf.blit(text_surface, text_rect)
\ No newline at end of file
+	surf.blit(text_surface, text_rect)
@@ -0,0 +1,241 @@
+""" This module contains the ChunkedLevel class, which streams the walls of a level in and out in chunks. Only the part of the level near the cameras exists
+as wall sprites and pre-rendered surfaces, so startup time and memory depend on the size of the screens rather than the size of the map.
+"""
+
+import pygame as pg
+import numpy as np
+from config import *
+from sprites import Wall
+from spatial import classify_tiles, SYMBOLS
+
+class Chunk:
+    """ A square block of tiles of the level which has been materialized into wall sprites and a pre-rendered surface.
+
+    Attributes
+    ----------
+    column, row : int, int
+        Position of chunk in chunks.
+    rect : pygame.Rect
+        Area of the level covered by chunk, in level coordinates.
+    walls : dict
+        Maps tile position (column, row) to the Wall on that tile.
+    surf : pygame.Surface|None
+        All walls of chunk blitted to one surface. None if the level is not rendered.
+    last_used : int
+        Number of the latest stream the chunk was needed in.
+    """
+    def __init__(self, column, row, rect):
+        """
+        Args
+        ----
+        column, row : int, int
+            Position of chunk in chunks.
+        rect : pygame.Rect
+            Area of the level covered by chunk.
+        """
+        self.column = column
+        self.row = row
+        self.rect = rect
+        self.walls = {}
+        self.surf = None
+        self.last_used = 0
+
+class ChunkedLevel:
+    """ Level divided into chunks of chunk_size x chunk_size tiles. Chunks near the given views are loaded, which creates their wall sprites and renders
+    them once into a surface, and chunks which have not been needed for the longest time are unloaded when more chunks are loaded than the memory budget
+    allows. The map itself is the source of truth, so an unloaded chunk is loaded again exactly as it was.
+
+    Attributes
+    ----------
+    map : Map
+        Map of the level.
+    textures : dict
+        Texture of each symbol that is a wall.
+    masks : dict
+        Mask of each symbol that is a wall, shared by all walls with that symbol.
+    group : pygame.sprite.Group
+        Group the wall sprites of loaded chunks are added to.
+    chunk_size : int
+        Side length of a chunk in tiles.
+    max_chunks : int
+        Number of chunks which fit in the memory budget.
+    render : bool
+        If False no surfaces are made, only wall sprites.
+    chunks : dict
+        Maps chunk position (column, row) to loaded Chunk.
+
+    Methods
+    -------
+    load(column, row)
+        Return chunk at position, loading it if it is not loaded.
+    unload(column, row)
+        Remove the walls of a chunk and free its surface.
+    stream(views)
+        Load all chunks near views and unload the least recently used chunks above the memory budget.
+    draw(surf, camera)
+        Blit the loaded chunks visible to camera onto surf.
+    set_tile(column, row, tile)
+        Update a loaded chunk after a tile of the map changed.
+    """
+    def __init__(self, tilemap, textures:dict, group:pg.sprite.Group, masks=None, chunk_size=CHUNK_SIZE, budget=CHUNK_MEMORY_BUDGET, render=True):
+        """
+        Args
+        ----
+        tilemap : Map
+            Map of the level.
+        textures : dict
+            Texture of each symbol that is a wall.
+        group : pygame.sprite.Group
+            Group the wall sprites are added to.
+        masks : dict|None
+            Mask of each symbol that is a wall. Made from textures if None. (default None)
+        chunk_size : int
+            Side length of a chunk in tiles. (default CHUNK_SIZE)
+        budget : int
+            Memory budget of chunk surfaces in megabytes. (default CHUNK_MEMORY_BUDGET)
+        render : bool
+            Make surfaces for the chunks. (default True)
+        """
+        self.map = tilemap
+        self.textures = textures
+        self.masks = masks if masks is not None else {tile: pg.mask.from_surface(texture) for tile, texture in textures.items()}
+        self.group = group
+        self.chunk_size = chunk_size
+        self.render = render
+        self.chunks = {}
+
+        # Every chunk has a 32 bit surface of chunk_size * TILESIZE pixels squared. Chunks needed by the current views are kept even above the budget.
+        chunk_bytes = (chunk_size * TILESIZE) ** 2 * 4
+        self.max_chunks = max(budget * 1024 ** 2 // chunk_bytes, 1)
+
+        self._pixels = chunk_size * TILESIZE
+        self._streams = 0
+
+    def _chunk_range(self, rect:pg.Rect, margin=0):
+        """ Yield the positions of the chunks overlapped by rect, extended by margin chunks on every side and clamped to the map. """
+        size = self._pixels
+        cols = (self.map.mapwidth - 1) // self.chunk_size
+        rows = (self.map.mapheight - 1) // self.chunk_size
+
+        for row in range(max(rect.top // size - margin, 0), min((rect.bottom - 1) // size + margin, rows) + 1):
+            for column in range(max(rect.left // size - margin, 0), min((rect.right - 1) // size + margin, cols) + 1):
+                yield column, row
+
+    def load(self, column:int, row:int) -> Chunk:
+        """ Return chunk at position, loading it if it is not loaded.
+
+        Args
+        ----
+        column, row : int, int
+            Position of chunk.
+
+        Returns
+        -------
+        chunk : Chunk
+            The loaded chunk.
+        """
+        chunk = self.chunks.get((column, row))
+        if chunk is not None:
+            return chunk
+
+        size = self.chunk_size
+        chunk = Chunk(column, row, pg.Rect(column * self._pixels, row * self._pixels, self._pixels, self._pixels))
+
+        # Only the tiles of this chunk are read from the grid, which for a memory-mapped map means only these pages are loaded from disk.
+        top, left = row * size, column * size
+        block = self.map.grid[top:top + size, left:left + size]
+        ys, xs = np.nonzero(classify_tiles(block, self.textures))
+        symbols = SYMBOLS[np.asarray(block)[ys, xs]].tolist()
+
+        # The walls share the mask of their texture id and are added to the group all at once.
+        for x, y, tile in zip((xs + left).tolist(), (ys + top).tolist(), symbols):
+            chunk.walls[(x, y)] = Wall((), x, y, self.textures[tile], tile, self.masks[tile])
+        self.group.add(*chunk.walls.values())
+
+        if self.render:
+            chunk.surf = pg.Surface(chunk.rect.size, pg.SRCALPHA)
+            offset = (-chunk.rect.x, -chunk.rect.y)
+            chunk.surf.blits([(wall.image, wall.rect.move(offset)) for wall in chunk.walls.values()], doreturn=False)
+
+        self.chunks[(column, row)] = chunk
+        return chunk
+
+    def unload(self, column:int, row:int) -> None:
+        """ Remove the walls of a chunk and free its surface.
+
+        Args
+        ----
+        column, row : int, int
+            Position of chunk.
+        """
+        chunk = self.chunks.pop((column, row), None)
+        if chunk is not None:
+            self.group.remove(*chunk.walls.values())
+
+    def stream(self, views) -> None:
+        """ Load all chunks near views and unload the least recently used chunks above the memory budget. Chunks within one chunk of a view are loaded
+        ahead of time, so that they are ready before they scroll into view.
+
+        Args
+        ----
+        views : iterable[pygame.Rect]
+            Visible areas of the level, e.g. the view of each camera.
+        """
+        self._streams += 1
+        for view in views:
+            for column, row in self._chunk_range(view, margin=1):
+                self.load(column, row).last_used = self._streams
+
+        if len(self.chunks) <= self.max_chunks:
+            return
+
+        # Unload the chunks not needed for the longest time, but never a chunk needed now.
+        stale = sorted((chunk for chunk in self.chunks.values() if chunk.last_used != self._streams), key=lambda chunk: chunk.last_used)
+        for chunk in stale[:len(self.chunks) - self.max_chunks]:
+            self.unload(chunk.column, chunk.row)
+
+    def draw(self, surf:pg.Surface, camera) -> None:
+        """ Blit the loaded chunks visible to camera onto surf.
+
+        Args
+        ----
+        surf : pygame.Surface
+            Surface to blit to, typically the surface of a Screen.
+        camera : Camera
+            Camera deciding what part of the level is visible.
+        """
+        view = camera.view
+        blits = []
+        for key in self._chunk_range(view):
+            chunk = self.chunks.get(key)
+            if chunk is not None and chunk.surf is not None:
+                blits.append((chunk.surf, (chunk.rect.x - view.x, chunk.rect.y - view.y)))
+        surf.blits(blits, doreturn=False)
+
+    def set_tile(self, column:int, row:int, tile:str) -> None:
+        """ Update a loaded chunk after a tile of the map changed. Unloaded chunks are up to date when they are loaded from the map.
+
+        Args
+        ----
+        column, row : int, int
+            Position of tile.
+        tile : str
+            New symbol of tile.
+        """
+        chunk = self.chunks.get((column // self.chunk_size, row // self.chunk_size))
+        if chunk is None:
+            return
+
+        old = chunk.walls.pop((column, row), None)
+        if old is not None:
+            old.kill()
+
+        wall = None
+        if tile in self.textures:
+            wall = chunk.walls[(column, row)] = Wall(self.group, column, row, self.textures[tile], tile, self.masks[tile])
+
+        if chunk.surf is not None:
+            dest = (column * TILESIZE - chunk.rect.x, row * TILESIZE - chunk.rect.y)
+            chunk.surf.fill((0, 0, 0, 0), (dest, (TILESIZE, TILESIZE)))
+            if wall is not None:
+                chunk.surf.blit(wall.image, dest)
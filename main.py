@@ -1,19 +1,27 @@
 """ Main loop object of this game source.
 
-Usage: run this module directly.
+Usage: run this module directly. Record a match with --record match.rep and play it again with --replay match.rep.
 """
 
+import time
 import pygame as pg
 import numpy as np
-from os import listdir
+from argparse import ArgumentParser
 from os.path import join, dirname
 
-from game_base_module import *
+from game_base_module import Loop, EventHandler, BLACK
 from config import *
 from map import Map, Screen, Camera
-from sprites import Wall, Scoreboard
+from level import ChunkedLevel
+from spatial import TileGrid, LevelMask, SpriteHash, HashedGroup, PadIndex, SYMBOLS
+from sprites import Scoreboard, SpritePool
 from player import Player
 from controller import Controller
+from effects import SmokeSystem, LaserBeam, Explotion
+from physics import PhysicsWorld
+from textures import RotationCache
+from assets import AssetManager
+from replay import Replay
 
 vec = pg.math.Vector2
 
@@ -26,6 +34,8 @@ class Main(Loop):
         Path to file.
     texturedir : str | path_like
         Path to directory containing textures.
+    map_file : str | path_like
+        Path to map file.
     width, height : int, int
         Measurements of main display
     fps : int
@@ -50,42 +60,86 @@ class Main(Loop):
         Dedicated screen to player2.
     center : pygame.math.Vector2
         Vector contatining the center coordinates of the main display.
+    rotations : RotationCache
+        Cache of rotated textures shared by all players and laser beams.
+    assets : AssetManager
+        Loads the textures in the background.
+    textures : dict
+        Texture of each block used by the map.
+    tile_masks : dict
+        Collision mask of each block texture, shared by all walls with that texture.
+    level : ChunkedLevel
+        Streams wall sprites and pre-rendered surfaces of the level in chunks around the cameras.
+    landing_pads : PadIndex
+        Index of the landing pads, runs of landing pad tiles, used to choose where to respawn.
+    tile_grid : TileGrid
+        Collision index of all walls by tile position.
+    level_mask : LevelMask|None
+        Merged collision mask of all walls. None unless MERGED_LEVEL_MASK is set in config.
+    collider : TileGrid|LevelMask
+        What sprites use to check for collisions with walls.
+    smoke : SmokeSystem
+        Particle system for the exhaust of all players.
+    physics : PhysicsWorld
+        Moves the bodies of all players and laser beams in one vectorized step per tick.
+    all_bodies : pygame.sprite.Group
+        Sprites with a body in physics.
+    laser_pool, explotion_pool, player_pool : SpritePool, SpritePool, SpritePool
+        Killed laser beams, explotions and players kept for reuse, so a match in progress makes no new sprites.
+    sprite_hash : SpriteHash
+        Spatial index of all dynamic sprites, used to cull sprites outside the view of each camera.
     
     Methods
     -------
     load_data()
-        Method for loading textures and maps and storing them in variables.
-    load_img_to_dict(path_to_dir:str|path_like, counter_key=False, sort=False)
-        Method for loading an image to a dictionary.
-    load_img_to_list(path_to_dir:str|path_like, sort=False)
-        Method for loading an image to a list.
+        Method for starting to load textures and loading maps.
+    load_block(tile)
+        Method for adding the texture and mask of a block, waiting for the texture to be decoded.
     new()
         Instantiate all sprites and groups again as well as set up map once again.
     run()
         Defines a frame and therefore everytime run() is called the clock ticks and 
         event handling, updating and drawing happens again.
     update()
-        Update groups and camera.
+        Update groups.
     draw()
-        Draw all groups.
+        Update camera and statuses, then draw all groups. Returns the changed rects of the display if DIRTY_RECTS is set in config.
     event_handling()
         Handle events using EventDispatcher.
     keypress_handler(event)
         Handles keypresses and is attached to an EventHandler.
+    redraw()
+        Blit and show the whole screen on the next frame.
     reset(event)
         Handles a reset by calling new() on keypress 'r'. Attached to an EventHandler.
     respawn(player_n, lp_rect, reason)
         Respawns player with player number player_n at the top of landing pad rect lp_rect.
+    add_wall(column, row, tile)
+        Add a wall to the level at runtime.
+    destroy_wall(column, row)
+        Remove a wall from the level at runtime.
     """
-    def __init__(self):
+    def __init__(self, headless=False, map_file="testmap1.map", profile=False):
+        """
+        Args
+        ----
+        headless : bool
+            Run without a display, only simulating the game. See Loop. (default False)
+        map_file : str
+            Path to map file, relative to this file. (default "testmap1.map")
+        profile : bool
+            Time the sections of every frame, see Loop. (default False)
+        """
+
         # set path to main file
         self.path = dirname(__file__)
 
-        # set path to directory containing textures.
+        # set path to directory containing textures, and to the map.
         self.texturedir = join(self.path, "textures")
+        self.map_file = join(self.path, map_file)
 
         # super Loop object
-        super().__init__(WIDTH, HEIGHT, FPS)
+        super().__init__(WIDTH, HEIGHT, FPS, headless, TICK_RATE, MAX_SUBSTEPS, profile)
 
         self.screen1 = Screen(0, 0, self.width // 2, self.height)
         self.screen2 = Screen(self.width // 2, 0, self.width // 2, self.height)
@@ -93,110 +147,189 @@ class Main(Loop):
         # set center of screen
         self.center = vec(self.width // 2, self.height // 2)
 
+        # time the caption was last updated
+        self._caption_t = 0
+
         self.resethandler = EventHandler(pg.KEYDOWN)
         self.resethandler.handler = self.reset
         self.dispatcher.register_handler(self.resethandler)
 
     def load_data(self):
-        """ Method for loading textures and maps and storing them in variables. """
-
-        self.map = Map("testmap1.txt")
-        self.textures = self.load_img_to_dict(join(self.texturedir, "blocks"))
-        self.rocket_textures = self.load_img_to_dict(join(self.texturedir, "rocket"), True, True)
-        self.smoke_img = pg.image.load(join(self.texturedir, "smoke", "smoke.png")).convert_alpha()
-        self.laser_img = pg.image.load(join(self.texturedir, "laser", "laser_beam.png")).convert_alpha()
-        self.explotion_img = self.load_img_to_list(join(self.texturedir, "explotion"), sort=True)
-        self.background = pg.image.load(join(self.texturedir, "background", "test_background.png")).convert_alpha()
-
-    @staticmethod
-    def load_img_to_dict(path_to_dir:str, counter_key=False, sort=False) -> dict:
-        """ Method for loading an image to a dictionary. """
-
-        imgs = listdir(path_to_dir)
+        """ Method for starting to load textures and loading maps. Textures are decoded in the background and waited for when they are needed. """
 
-        if sort:
-            imgs = sorted(listdir(path_to_dir))
+        self.map = Map(self.map_file)
+        self.assets = AssetManager(self.texturedir, join(self.path, ATLAS_CACHE), convert=not self.headless)
 
-        if counter_key:
-            keys = range(0, len(imgs))
-            return {i:pg.image.load(join(path_to_dir, im)).convert_alpha() for (i, im) in zip(keys, imgs)}
+        # Only the blocks used by the map are decoded, other blocks are decoded if a wall of that kind is added. The background is not drawn, so it is
+        # never decoded.
+        used = set(SYMBOLS[np.unique(self.map.grid)])
+        self.block_assets = self.assets.load_dir("blocks", prefetch=used)
+        self.rocket_assets = self.assets.load_dir("rocket")
+        self.smoke_asset = self.assets.load("smoke/smoke.png")
+        self.laser_img = self.assets.load("laser/laser_beam.png")
+        self.explotion_img = list(self.assets.load_dir("explotion").values())
+        self.background = self.assets.load("background/test_background.png", prefetch=False)
+        self.rotations = RotationCache()
 
-        imname = [name.split(".")[0] for name in imgs]
-        return {name:pg.image.load(join(path_to_dir, im)).convert_alpha() for (name, im) in zip(imname,imgs)}
+    def load_block(self, tile:str) -> None:
+        """ Method for adding the texture and mask of a block to textures and tile_masks, waiting for the texture to be decoded. """
 
-    @staticmethod
-    def load_img_to_list(path_to_dir, sort=False):
-        """ Method for loading an image to a list. """
-
-        if sort:
-            return [pg.image.load(join(path_to_dir, im)).convert_alpha() for im in sorted(listdir(path_to_dir))]
-        return [pg.image.load(join(path_to_dir, im)).convert_alpha() for im in listdir(path_to_dir)]
+        self.textures[tile] = self.block_assets[tile].get()
+        self.tile_masks[tile] = pg.mask.from_surface(self.textures[tile])
 
     def new(self):
         """ Called when game is initialized, can also be used for resetting the whole display. """
         
-        self.all_sprites = pg.sprite.Group()
+        # Dynamic sprites are indexed by position as they are added, killed and moved, so cameras only look at the sprites near their view.
+        self.sprite_hash = SpriteHash()
+        self.all_sprites = HashedGroup(self.sprite_hash)
         self.all_walls = pg.sprite.Group()
         self.all_projectiles = pg.sprite.Group()
         self.all_players = pg.sprite.Group()
         self.all_statuses = pg.sprite.Group()
+        self.all_bodies = pg.sprite.Group()
+        self.physics = PhysicsWorld()
+        self.laser_pool = SpritePool(LaserBeam)
+        self.explotion_pool = SpritePool(Explotion)
+        self.player_pool = SpritePool(Player)
+
+        # Wait for the textures needed to build the level, players and smoke. Lasers and explosions finish loading in the background.
+        self.textures, self.tile_masks = {}, {}
+        for tile, asset in self.block_assets.items():
+            if asset.requested:
+                self.load_block(tile)
+        self.rocket_textures = {i: asset.get() for i, asset in enumerate(self.rocket_assets.values())}
+        self.smoke_img = self.smoke_asset.get()
 
         self.controller1 = Controller("wasd")
         self.controller2 = Controller("arrows")
 
         self.scoreboard = Scoreboard(self)
 
-        for row, tiles in enumerate(self.map.map):
-            for column, tile in enumerate(tiles):
-                if tile != "." and tile != "1" and tile != "2":
-                    Wall([self.all_walls, self.all_sprites], column, row, self.textures[tile], tile)
-                elif tile == "1":
-                    self.player1 = Player(self, self.controller1, column, row, self.rocket_textures, 1, self.screen1)
-                elif tile == "2":
-                    self.player2 = Player(self, self.controller2, column, row, self.rocket_textures, 2, self.screen2)
+        for column, row in self.map.find("1"):
+            self.player1 = self.player_pool.acquire(self, self.controller1, column, row, self.rocket_textures, 1, self.screen1)
+        for column, row in self.map.find("2"):
+            self.player2 = self.player_pool.acquire(self, self.controller2, column, row, self.rocket_textures, 2, self.screen2)
+
+        # Walls are static, therefore they are not part of all_sprites. They are created and rendered in chunks near the cameras when drawing,
+        # while collisions are checked against the whole map. Nothing is rendered when headless.
+        self.level = ChunkedLevel(self.map, self.textures, self.all_walls, self.tile_masks, render=not self.headless)
+        self.landing_pads = PadIndex(self.map)
+        self.tile_grid = TileGrid(self.map, self.tile_masks)
+        self.level_mask = LevelMask(self.map, self.tile_masks) if MERGED_LEVEL_MASK else None
+        self.collider = self.level_mask or self.tile_grid
+        self.smoke = SmokeSystem(self.smoke_img)
 
         self.camera1 = Camera(self.map.width, self.map.height)
         self.camera2 = Camera(self.map.width, self.map.height)
 
+        # Everything has changed, so the next frame updates the whole display. Tiles changed at runtime are updated on the display in the next frame.
+        self._redraw = True
+        self._changed_tiles = []
 
-    def update(self):
-        """ Update groups and camera. """
+        # Convert the textures decoded meanwhile, and write the texture cache if everything has loaded.
+        self.assets.finalize()
 
-        # update all groups
-        self.all_sprites.update(self.all_walls)
-        self.all_statuses.update()
-        self.camera1.update(self.player1)
-        self.camera2.update(self.player2)
+    def update(self):
+        """ Update groups. Called once per fixed time step. """
+
+        # Convert textures which have finished decoding since the last tick. This is done here rather than when drawing, so headless games also update
+        # the texture cache once loading finishes.
+        self.assets.finalize()
+
+        # Sprites decide on the forces on their bodies, then the physics world moves all bodies at once and the bodies check for collisions.
+        # Sprites added during the tick are first updated on the next one, therefore the bodies to check are those there were at the start.
+        # Sprites killed during the previous tick can be reused from now on.
+        # The phases are timed as player physics, collisions and particles by the profiler.
+        profiler = self.profiler
+        bodies = self.all_bodies.sprites()
+        with profiler.section("update/physics"):
+            self.physics.begin()
+            self.laser_pool.recycle()
+            self.explotion_pool.recycle()
+            self.player_pool.recycle()
+            self.all_sprites.update(self.collider)
+            self.physics.step(self.dt)
+        with profiler.section("update/collisions"):
+            for body in bodies:
+                body.after_step(self.collider)
+                self.sprite_hash.touch(body)
+        with profiler.section("update/particles"):
+            self.smoke.update(self.dt)
 
     def draw(self):
-        """ Draw all groups. """
+        """ Update camera and statuses, then draw all groups. Called once per frame.
+
+        Positions are interpolated by alpha between the previous and the latest update, so motion is smooth even if the frame rate and tick rate differ.
+
+        Returns
+        -------
+        rects : list[pygame.Rect]|None
+            The rects of the display which changed, or None if the whole display should be updated.
+        """
+
+        # Statuses and cameras only affect what is drawn, therefore they are updated per frame rather than per time step.
+        with self.profiler.section("draw/hud"):
+            self.all_statuses.update()
+        self.camera1.update(self.player1, self.alpha)
+        self.camera2.update(self.player2, self.alpha)
 
         # fill screen with background color
         self.screen1.surf.fill(BACKGROUND_COLOR)
         self.screen2.surf.fill(BACKGROUND_COLOR)
 
-        # Display FPS in caption
-        pg.display.set_caption(f"{self.clock.get_fps():.2f}")
+        # Display FPS in caption, only every CAPTION_INTERVAL seconds as setting the caption is slow.
+        now = pg.time.get_ticks() / 1000
+        if now - self._caption_t >= CAPTION_INTERVAL:
+            pg.display.set_caption(f"{self.clock.get_fps():.2f}")
+            self._caption_t = now
         
-        # Instead of calling all_sprites.draw() we iterate over each one of them and 
-        # blit them on both screen1 and screen2 surfaces. We also apply the camera to
-        # each of the sprites.
-
-        for sprite in self.all_sprites:
-            self.screen1.surf.blit(sprite.image, self.camera1.apply(sprite.rect))
-            self.screen2.surf.blit(sprite.image, self.camera2.apply(sprite.rect))
-
-        # blit each of screen1 and screen2 to main screen.
-        self.screen.blit(self.screen1.surf, self.screen1.rect)
-        self.screen.blit(self.screen2.surf, self.screen2.rect)
-
-        # Draw a line to separate screens.
-        pg.draw.line(self.screen, BLACK, (self.width // 2, 0), (self.width //2,self.height), 5)
+        # Blit the visible chunks of the level, then smoke and the dynamic sprites on top.
+        # Keep track of where smoke and sprites are blitted, only those areas change unless the camera moves.
+        profiler = self.profiler
+        with profiler.section("draw/tiles"):
+            self.level.stream((self.camera1.view, self.camera2.view))
+            self.level.draw(self.screen1.surf, self.camera1)
+            self.level.draw(self.screen2.surf, self.camera2)
+
+        # Instead of calling all_sprites.draw() we look up the sprites in the sprite hash and only
+        # blit the ones inside the view of each camera on screen1 and screen2 surfaces.
+        with profiler.section("draw/sprites"):
+            dirty1 = self.smoke.draw(self.screen1.surf, self.camera1, self.alpha * self.dt - self.dt)
+            dirty2 = self.smoke.draw(self.screen2.surf, self.camera2, self.alpha * self.dt - self.dt)
+            dirty1 += self.camera1.draw(self.screen1.surf, self.camera1.visible(self.sprite_hash), self.alpha)
+            dirty2 += self.camera2.draw(self.screen2.surf, self.camera2.visible(self.sprite_hash), self.alpha)
+
+            # Walls added or destroyed since the last frame are drawn into the level, but only dirty areas reach the display.
+            for rect in self._changed_tiles:
+                dirty1.append(self.camera1.apply(rect).clip(self.screen1.surf.get_rect()))
+                dirty2.append(self.camera2.apply(rect).clip(self.screen2.surf.get_rect()))
+            self._changed_tiles.clear()
+
+        # blit each of screen1 and screen2 to main screen. Without dirty rects, or if the camera scrolled, the whole screen is blitted.
+        with profiler.section("draw/screens"):
+            full = not DIRTY_RECTS or self._redraw
+            rects = self.screen1.present(self.screen, dirty1, full or self.camera1.moved)
+            rects += self.screen2.present(self.screen, dirty2, full or self.camera2.moved)
+            self._redraw = False
+
+            # Draw a line to separate screens.
+            rects.append(pg.draw.line(self.screen, BLACK, (self.width // 2, 0), (self.width //2,self.height), 5))
 
         # Draw statuses the regular way as these are not wanted to be in the "frame" but
         # rather static "on top" of the screen.
-        self.all_statuses.draw(self.screen)
-        # draw_text(self.screen, "ttestestset", 28, 100, 10, WHITE, True)
+        with profiler.section("draw/hud"):
+            self.all_statuses.draw(self.screen)
+            rects += [status.rect for status in self.all_statuses]
+
+        # Let Loop update only the changed rects of the display, or flip the whole display.
+        if full:
+            return None
+        return rects
+
+    def redraw(self):
+        """ Blit the whole of screen1 and screen2 to the screen and update the whole display on the next frame, even with DIRTY_RECTS. """
+        self._redraw = True
 
     def reset(self, event):
         """ Handles a reset by calling new() on keypress 'r'. Attached to an EventHandler. """
@@ -207,41 +340,147 @@ class Main(Loop):
             self.new()
 
     def respawn(self, player_n, lp_rect, reason):
-        """ Respawns player with player number player_n at the top of landing pad rect lp_rect. 
+        """ Respawns player with player number player_n at the top of landing pad rect lp_rect. The player is reused from player_pool if possible.
         
         Args
         ----
         player_n : int
             Either 1 or 2 representing player that is to respawn.
         lp_rect : pygame.Rect
-            Rectangle of landing pad.
+            Rectangle of landing pad, the player is placed at the middle of its top.
         reason : str
             Why was the player killed, used to decide wheter to give or take point.
         """
 
         if player_n == 1:
-            self.player1 = Player(self, self.controller1, 0,0, self.rocket_textures, 1, self.screen1)
+            self.player1 = self.player_pool.acquire(self, self.controller1, 0,0, self.rocket_textures, 1, self.screen1)
             self.player1.rect.midbottom = lp_rect.midtop
             self.player1.pos = vec(self.player1.rect.center)
+            self.player1.prev_pos = vec(self.player1.pos)
 
             if reason == "shot":
                 self.scoreboard.give_point("2")
+                self.scoreboard.record_kill("2")
             if reason == "wall":
                 self.scoreboard.take_point("1")
+                self.scoreboard.record_wall_death("1")
         elif player_n == 2:
-            self.player2 = Player(self, self.controller2, 0,0, self.rocket_textures, 2, self.screen2)
+            self.player2 = self.player_pool.acquire(self, self.controller2, 0,0, self.rocket_textures, 2, self.screen2)
             self.player2.rect.midbottom = lp_rect.midtop
             self.player2.pos = vec(self.player2.rect.center)
+            self.player2.prev_pos = vec(self.player2.pos)
 
             if reason == "shot":
                 self.scoreboard.give_point("1")
+                self.scoreboard.record_kill("1")
             if reason == "wall":
                 self.scoreboard.take_point("2")
+                self.scoreboard.record_wall_death("2")
+
+    def add_wall(self, column, row, tile):
+        """ Add a wall to the level at runtime. The map, level chunk, tile grid and level mask are updated for this tile only.
+
+        Args
+        ----
+        column, row : int, int
+            Tile position of the wall.
+        tile : str
+            Texture id of the wall, as in the map text file.
+        """
+
+        if tile not in self.textures:
+            self.load_block(tile)
+
+        self.destroy_wall(column, row)
+        self.map.set_tile(column, row, tile)
+        self.level.set_tile(column, row, tile)
+        self._changed_tiles.append(pg.Rect(column * TILESIZE, row * TILESIZE, TILESIZE, TILESIZE))
+        self.tile_grid.add(column, row, tile)
+        if self.level_mask is not None:
+            self.level_mask.add(column, row, tile)
+        if tile == "l":
+            self.landing_pads.update(column, row)
+
+    def destroy_wall(self, column, row):
+        """ Remove a wall from the level at runtime. The map, level chunk, tile grid and level mask are updated for this tile only.
+
+        Args
+        ----
+        column, row : int, int
+            Tile position of the wall.
+        """
+
+        tile = chr(self.map.grid[row, column])
+        if tile not in self.textures:
+            return
+
+        self.map.set_tile(column, row, ".")
+        self.level.set_tile(column, row, ".")
+        self._changed_tiles.append(pg.Rect(column * TILESIZE, row * TILESIZE, TILESIZE, TILESIZE))
+        self.tile_grid.remove(column, row)
+        if self.level_mask is not None:
+            self.level_mask.remove(column, row, tile)
+        if tile == "l":
+            self.landing_pads.update(column, row)
 
 if __name__ == "__main__":
+    parser = ArgumentParser(description="Two player Mayhem clone.")
+    parser.add_argument("--headless", action="store_true", help="simulate without a display")
+    parser.add_argument("--ticks", type=int, default=None, help="number of frames to simulate when headless")
+    parser.add_argument("--map", default="testmap1.map", help="map file to play on")
+    parser.add_argument("--record", default=None, help="record the match to this replay file until the game is quit")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random module when recording")
+    parser.add_argument("--replay", default=None, help="play this replay file, as fast as possible when headless, and check its outcome")
+    parser.add_argument("--profile", action="store_true", help="time the sections of every frame and show them in an overlay, toggled with F3")
+    parser.add_argument("--profile-out", default=None, help="when the game ends, write the frame times to this .csv file or their percentiles to this .json file")
+    args = parser.parse_args()
+    if args.profile_out is not None and not args.profile_out.endswith((".csv", ".json")):
+        parser.error(f"--profile-out must end with .csv or .json, not {args.profile_out}")
+    profile = args.profile or args.profile_out is not None
+
+    def finish_profile(game):
+        """ Print the percentiles of the frame times and export them, if profiling. """
+        if profile:
+            print(game.profiler.report())
+        if args.profile_out:
+            game.profiler.export(args.profile_out)
+
+    if args.replay:
+        replay = Replay.load(args.replay)
+        mayhem_clone = Main(headless=args.headless, map_file=replay.map_file, profile=profile)
+
+        t0 = time.perf_counter()
+        try:
+            same = replay.play(mayhem_clone)
+        finally:
+            finish_profile(mayhem_clone)
+        elapsed = time.perf_counter() - t0
+
+        print(mayhem_clone.scoreboard)
+        print(f"{replay.ticks} ticks in {elapsed:.2f}s, {replay.ticks * mayhem_clone.dt / elapsed:.1f}x real time")
+        if not same:
+            print(f"outcome differs from recording: {replay.scores} {replay.stats}")
+            exit(1)
+        exit()
 
     # call on simulation, execute new and run to start main loop
-    mayhem_clone = Main()
-    while True:
-        mayhem_clone.new()
-        mayhem_clone.run()
+    mayhem_clone = Main(headless=args.headless, map_file=args.map, profile=profile)
+
+    # Quitting the game exits, so the replay and profile are saved on the way out.
+    try:
+        if args.record:
+            Replay.start(mayhem_clone, args.seed)
+            try:
+                mayhem_clone.run(args.ticks if args.headless else None)
+            finally:
+                Replay.stop(mayhem_clone).save(args.record)
+        elif args.headless:
+            mayhem_clone.new()
+            mayhem_clone.run(args.ticks)
+            print(mayhem_clone.scoreboard)
+        else:
+            while True:
+                mayhem_clone.new()
+                mayhem_clone.run()
+    finally:
+        finish_profile(mayhem_clone)
@@ -1,23 +1,44 @@
-""" This module contains the Map and Screen class. Use the Screen class for a object like one of the screens in a split-screen implementation. The Map class
+""" This module contains the Map, Camera and Screen class. Use the Screen class for a object like one of the screens in a split-screen implementation. The Map class
 is used to easily read a text file and converting it to a Map object usable for easy map-generation in a game.
+
+Binary maps are not kept in the repository, the text maps are the source. Opening a binary map, e.g. testmap1.map, builds it from the text map of the same
+name, testmap1.txt, if it is missing or older than the text map. A map can also be converted by running this module directly, e.g.
+`python3 map.py testmap1.txt testmap1.map`.
 """
 
+import os
+import math
+import struct
+from argparse import ArgumentParser
+
 import pygame as pg
+import numpy as np
 from config import *
+from spatial import traverse_tiles
+
+# Binary map format: a header with a magic number, format version, width and height in tiles, followed by one uint8 per tile row by row.
+# The tile id of a tile is the ASCII code of its symbol in the text format.
+MAP_MAGIC = b"MAYM"
+MAP_VERSION = 1
+MAP_HEADER = struct.Struct("<4sHII")
 
 class Map:
-    """ Map object used for reading a text file containing symbols representing a tile.
+    """ Map object used for reading a map file containing symbols representing a tile. Maps are either text files with one row of symbols per line, or
+    binary files (.map) in the format described by MAP_HEADER, which are memory-mapped so that even a large map opens instantly without being copied. A
+    binary map is built from the text map (.txt) of the same name when it is missing or older than the text map.
 
     Note: This class is greatly inspired by the implementation at: https://github.com/kidscancode/pygame_tutorials/blob/master/tilemap/part%2004/tilemap.py
     
     Attributes
     ----------
     _f : str
-        Path to map text file.
+        Path to map file.
+    grid : numpy.ndarray
+        Tile ids, the ASCII codes of the symbols, as uint8 of shape (mapheight, mapwidth). Changes are kept in memory and never written to a map file.
     map : list
-        Each entry is a string containing symbols representing a tile.
+        Each entry is a string containing symbols representing a tile. Made from grid the first time it is used.
     mapwidth : int
-        Number of symbols in each string. Represents lenght of rows.
+        Number of symbols in each string. Represents lenght of rows, the longest row of a text map.
     mapheight : int
         Number of rows in map.
     width : int
@@ -29,21 +50,41 @@ class Map:
     -------
     load_map()
         returns the read text file into a list of strings.
+    load_grid()
+        returns the grid of tile ids of the map file.
+    find(tile)
+        Find the positions of all tiles with the given symbol.
+    set_tile(column, row, tile)
+        Change the symbol of a tile.
+    save(path)
+        Write the map in the binary format.
+    raycast(origin, direction, max_distance=None, walls=None)
+        Find the first wall hit by a ray.
+    raycast_many(origins, directions, max_distance=None, walls=None)
+        Find the first wall hit by each of many rays at once.
     """
     def __init__(self, map_file):
         """
         Args
         ----
         map_file : str
-            Path to map text file.
+            Path to map text file or binary map file.
         """
         self._f = map_file
-        self.map = self.load_map()
-        self.mapwidth = len(self.map[0])
-        self.mapheight = len(self.map)
+        self._map = None
+        self._build_binary()
+        self.grid = self.load_grid()
+        self.mapheight, self.mapwidth = self.grid.shape
         self.width = self.mapwidth * TILESIZE
         self.height = self.mapheight * TILESIZE
 
+    @property
+    def map(self) -> list:
+        """ The map as a list of strings, one per row. """
+        if self._map is None:
+            self._map = [row.tobytes().decode("ascii") for row in self.grid]
+        return self._map
+
     def load_map(self):
         objects = []
         with open(self._f, "r") as f:
@@ -51,6 +92,236 @@ class Map:
                objects.append(row.strip())
         return objects
 
+    def _build_binary(self) -> None:
+        """ Convert the text map of the same name to the binary map file, if the map file is a binary map which is missing or older than the text map. """
+        root, ext = os.path.splitext(self._f)
+        source = root + ".txt"
+        if ext != ".map" or not os.path.exists(source):
+            return
+        if not os.path.exists(self._f) or os.path.getmtime(source) > os.path.getmtime(self._f):
+            convert_map(source, self._f)
+
+    def load_grid(self) -> np.ndarray:
+        """ Read the map file into a grid of tile ids. Binary map files are memory-mapped copy-on-write, text files are parsed.
+
+        Returns
+        -------
+        grid : numpy.ndarray
+            Tile ids of shape (rows, columns).
+        """
+        with open(self._f, "rb") as f:
+            header = f.read(MAP_HEADER.size)
+
+        if len(header) == MAP_HEADER.size and header[:len(MAP_MAGIC)] == MAP_MAGIC:
+            _, version, width, height = MAP_HEADER.unpack(header)
+            if version != MAP_VERSION:
+                raise ValueError(f"Unsupported map version {version} in {self._f}, expected {MAP_VERSION}.")
+            return np.memmap(self._f, dtype=np.uint8, mode="c", offset=MAP_HEADER.size, shape=(height, width))
+
+        # Rows of a text map may differ in length, short rows are padded with empty tiles to the longest row.
+        rows = [row for row in self.load_map() if row]
+        if not rows:
+            raise ValueError(f"Map file {self._f} has no rows.")
+        width = max(len(row) for row in rows)
+        return np.frombuffer("".join(row.ljust(width, ".") for row in rows).encode("ascii"), dtype=np.uint8).reshape(len(rows), width).copy()
+
+    def find(self, tile:str) -> list:
+        """ Find the positions of all tiles with the given symbol.
+
+        Args
+        ----
+        tile : str
+            Symbol to look for.
+
+        Returns
+        -------
+        positions : list[tuple[int, int]]
+            Column and row of each tile, row by row.
+        """
+        rows, columns = np.nonzero(self.grid == ord(tile))
+        return list(zip(columns.tolist(), rows.tolist()))
+
+    def set_tile(self, column:int, row:int, tile:str) -> None:
+        """ Change the symbol of a tile.
+
+        Args
+        ----
+        column, row : int, int
+            Position of tile.
+        tile : str
+            New symbol.
+        """
+        self.grid[row, column] = ord(tile)
+        if self._map is not None:
+            line = self._map[row]
+            self._map[row] = line[:column] + tile + line[column + 1:]
+
+    def save(self, path:str) -> None:
+        """ Write the map in the binary format.
+
+        Args
+        ----
+        path : str
+            Path of binary map file to write.
+        """
+
+        # Write to a file of this process and move it in place, so that games opening the map at the same time, e.g. the workers of batch.py, never
+        # map a half written file, and maps already open keep their own copy.
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, self.mapwidth, self.mapheight))
+            f.write(np.ascontiguousarray(self.grid, dtype=np.uint8).tobytes())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _blocking(walls) -> np.ndarray:
+        """ Return a lookup table from tile id to True if the tile is a wall. If walls is None every tile not in EMPTY_TILES is a wall. """
+        if walls is None:
+            blocking = np.ones(256, dtype=bool)
+            blocking[[ord(tile) for tile in EMPTY_TILES]] = False
+        else:
+            blocking = np.zeros(256, dtype=bool)
+            blocking[[ord(tile) for tile in walls]] = True
+        return blocking
+
+    def raycast(self, origin, direction, max_distance=None, walls=None):
+        """ Find the first wall hit by a ray, visiting the tiles along the ray in order. Walls fill their tiles, so the ray hits a wall where it enters its
+        tile, or at the origin if it starts inside one. The cost depends on how far the ray goes, not the size of the map.
+
+        Args
+        ----
+        origin : pygame.math.Vector2|tuple
+            Start of the ray in level coordinates.
+        direction : pygame.math.Vector2|tuple
+            Direction of the ray, of any length but zero.
+        max_distance : float|None
+            Distance after which the ray stops. If None the ray goes until it leaves the map. (default None)
+        walls : iterable[str]|None
+            Symbols of the tiles which stop the ray. If None every tile not in EMPTY_TILES. (default None)
+
+        Returns
+        -------
+        hit : tuple[str, tuple[int, int], float]|None
+            Symbol and column and row of the wall hit, and the distance from origin to where it is hit. None if no wall is hit.
+        """
+        x0, y0 = origin
+        dx, dy = direction
+        length = math.hypot(dx, dy)
+        dx, dy = dx / length, dy / length
+
+        # Stop where the ray leaves the map, there is nothing to hit outside.
+        distance = self._exit_distance(x0, y0, dx, dy)
+        if max_distance is not None:
+            distance = min(distance, max_distance)
+        if distance < 0:
+            return None
+
+        blocking = self._blocking(walls)
+        grid = self.grid
+        for column, row, t in traverse_tiles((x0, y0), (x0 + dx * distance, y0 + dy * distance)):
+            if 0 <= row < self.mapheight and 0 <= column < self.mapwidth:
+                code = grid[row, column]
+                if blocking[code]:
+                    return chr(code), (column, row), t * distance
+        return None
+
+    def _exit_distance(self, x0:float, y0:float, dx:float, dy:float) -> float:
+        """ Return the distance along a ray with unit direction (dx, dy) to where it leaves the map, negative if it starts outside. """
+        if not (0 <= x0 < self.width and 0 <= y0 < self.height):
+            return -1
+        exit_x = (self.width - x0) / dx if dx > 0 else -x0 / dx if dx < 0 else math.inf
+        exit_y = (self.height - y0) / dy if dy > 0 else -y0 / dy if dy < 0 else math.inf
+        return min(exit_x, exit_y)
+
+    def raycast_many(self, origins, directions, max_distance=None, walls=None) -> tuple:
+        """ Find the first wall hit by each of many rays at once. All rays take one step to their next tile at a time with NumPy, and rays leave the
+        batch as they hit a wall or reach their end, so thousands of rays are cast in about the time of the longest one.
+
+        Args
+        ----
+        origins : array_like
+            Starts of the rays in level coordinates, shape (n, 2) or (2,) for the same start for all rays.
+        directions : array_like
+            Directions of the rays, of any length but zero, shape (n, 2) or (2,) for the same direction for all rays.
+        max_distance : float|array_like|None
+            Distance after which each ray stops. If None the rays go until they leave the map. (default None)
+        walls : iterable[str]|None
+            Symbols of the tiles which stop the rays. If None every tile not in EMPTY_TILES. (default None)
+
+        Returns
+        -------
+        tiles : numpy.ndarray
+            Tile id of the wall each ray hits, 0 if it hits no wall, shape (n,).
+        columns, rows : numpy.ndarray, numpy.ndarray
+            Tile position of the wall each ray hits, -1 if it hits no wall, shape (n,).
+        distances : numpy.ndarray
+            Distance from origin to where each ray hits a wall, inf if it hits no wall, shape (n,).
+        """
+        origins, directions = np.broadcast_arrays(np.asarray(origins, dtype=float).reshape(-1, 2), np.asarray(directions, dtype=float).reshape(-1, 2))
+        n = len(origins)
+        directions = directions / np.hypot(directions[:, 0], directions[:, 1])[:, None]
+        size = np.array([self.width, self.height], dtype=float)
+
+        # Per axis, the distance along each ray to its next tile border and between two borders, as in traverse_tiles. Rays stop where they leave the map.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = 1 / directions
+            cells = np.floor(origins / TILESIZE).astype(np.int64)
+            steps = np.where(directions > 0, 1, -1)
+            next_t = np.where(directions > 0, ((cells + 1) * TILESIZE - origins) * inverse,
+                              np.where(directions < 0, (cells * TILESIZE - origins) * inverse, np.inf))
+            delta = np.where(directions != 0, TILESIZE * np.abs(inverse), np.inf)
+            limits = np.where(directions > 0, (size - origins) * inverse, np.where(directions < 0, -origins * inverse, np.inf)).min(axis=1)
+        if max_distance is not None:
+            limits = np.minimum(limits, max_distance)
+
+        tiles = np.zeros(n, dtype=np.uint8)
+        columns = np.full(n, -1, dtype=np.int64)
+        rows = np.full(n, -1, dtype=np.int64)
+        distances = np.full(n, np.inf)
+        t = np.zeros(n)
+
+        blocking = self._blocking(walls)
+        grid = np.asarray(self.grid)
+        shape = np.array([self.mapwidth, self.mapheight])
+
+        # Rays starting outside the map hit nothing.
+        active = np.flatnonzero(np.all((origins >= 0) & (origins < size), axis=1) & (limits >= 0))
+        while len(active):
+
+            # Look up the tiles the active rays are in, and retire the rays which hit a wall or left the map.
+            c = cells[active]
+            inside = np.all((c >= 0) & (c < shape), axis=1)
+            codes = np.zeros(len(active), dtype=np.uint8)
+            codes[inside] = grid[c[inside, 1], c[inside, 0]]
+            hit = blocking[codes] & inside
+
+            done = active[hit]
+            tiles[done] = codes[hit]
+            columns[done], rows[done] = c[hit, 0], c[hit, 1]
+            distances[done] = t[done]
+            active = active[~hit & inside]
+
+            # Step every remaining ray into whichever neighbouring tile it reaches first, then retire the rays which went past their end.
+            axis = (next_t[active, 0] >= next_t[active, 1]).astype(np.int64)
+            t[active] = next_t[active, axis]
+            cells[active, axis] += steps[active, axis]
+            next_t[active, axis] += delta[active, axis]
+            active = active[t[active] <= limits[active]]
+
+        return tiles, columns, rows, distances
+
+def convert_map(src:str, dst:str) -> None:
+    """ Convert a map file, e.g. one of the testmap text files, to the binary map format.
+
+    Args
+    ----
+    src : str
+        Path to map file to read.
+    dst : str
+        Path to binary map file to write.
+    """
+    Map(src).save(dst)
+
 class Camera:
     """ Camera object assigned to a sprite to follow which is the target in update() function. This implementation also does not move camera rectangle outside of boundaries.
     
@@ -66,17 +337,27 @@ class Camera:
         Width of camera rectangle.
     height : int
         Height of camera rectangle.
+    view : pygame.Rect
+        The part of the level that is visible through the camera, in level coordinates.
+    moved : bool
+        True if the latest update moved the camera.
     
     Methods
     -------
     apply(rect)
         Apply movement to given rect. Move rect inside cameras rectangle.
-    update(target)
+    visible(index)
+        Return the sprites in index which are inside the view of the camera.
+    draw(surf, sprites, alpha=1)
+        Blit sprites to surf, moved inside cameras rectangle. Returns the changed areas of surf.
+    update(target, alpha=1)
         Follows target by moving sprites relative to this as it sets the cameras rectangle to a new position based on the given target. This method also takes the
         boundaries into account by not moving the camera rectangle outside of the given edges.
     """
     def __init__(self, width, height):
         self.camera = pg.Rect(0, 0, width, height)
+        self.view = pg.Rect(0, 0, WIDTH // 2, HEIGHT)
+        self.moved = True
         self.width = width
         self.height = height
 
@@ -95,7 +376,70 @@ class Camera:
         """
         return rect.move(self.camera.topleft)
 
-    def update(self, target:pg.sprite.Sprite) -> None:
+    def visible(self, index) -> list:
+        """ Return the sprites in index which are inside the view of the camera.
+
+        Args
+        ----
+        index : SpriteHash
+            Spatial index of the sprites to cull.
+
+        Returns
+        -------
+        out : list[pygame.sprite.Sprite]
+            Sprites inside the view of the camera.
+        """
+        return index.query(self.view)
+
+    def draw(self, surf:pg.Surface, sprites, alpha=1) -> list[pg.Rect]:
+        """ Blit sprites to surf, moved inside cameras rectangle. Unlike apply this does not allocate a new rect per sprite.
+
+        Args
+        ----
+        surf : pygame.Surface
+            Surface to blit to, typically the surface of a Screen.
+        sprites : iterable[pygame.sprite.Sprite]
+            Sprites to blit.
+        alpha : float
+            How far between the previous and the latest update to draw sprites which move, see interpolate. (default 1)
+
+        Returns
+        -------
+        rects : list[pygame.Rect]
+            The areas of surf which were blitted to.
+        """
+        x, y = self.camera.topleft
+        return surf.blits([(sprite.image, self.interpolate(sprite, alpha, x, y)) for sprite in sprites])
+
+    @staticmethod
+    def interpolate(sprite:pg.sprite.Sprite, alpha:float, x=0, y=0) -> tuple[float, float]:
+        """ Find where to draw sprite between its position before and after the latest update. Sprites which move keep their previous position in prev_pos,
+        other sprites are drawn at their rect.
+
+        Args
+        ----
+        sprite : pygame.sprite.Sprite
+            Sprite to draw.
+        alpha : float
+            0 for the previous position, 1 for the latest position.
+        x, y : int, int
+            Offset to add. (default 0, 0)
+
+        Returns
+        -------
+        topleft : tuple[float, float]
+            Where to draw the topleft of sprite.
+        """
+        prev_pos = getattr(sprite, "prev_pos", None)
+        if prev_pos is None or alpha == 1:
+            return sprite.rect.x + x, sprite.rect.y + y
+
+        # Move the rect back by the part of the latest step that has not happened yet.
+        back = 1 - alpha
+        return (sprite.rect.x + x - (sprite.pos[0] - prev_pos[0]) * back,
+                sprite.rect.y + y - (sprite.pos[1] - prev_pos[1]) * back)
+
+    def update(self, target:pg.sprite.Sprite, alpha=1) -> None:
         """ Follows target by moving sprites relative to this as it sets the cameras rectangle to a new position based on the given target. This method also takes the
         boundaries into account by not moving the camera rectangle outside of the given edges.
         
@@ -103,16 +447,21 @@ class Camera:
         ----
         target : pygame.sprite.Sprite
             Sprite that camera will follow.
+        alpha : float
+            How far between the previous and the latest update to follow target, see interpolate. (default 1)
         """
-        x = -target.rect.x + WIDTH // 4
-        y = -target.rect.y + HEIGHT // 2
+        target_x, target_y = self.interpolate(target, alpha)
+        x = -int(target_x) + WIDTH // 4
+        y = -int(target_y) + HEIGHT // 2
 
         x = min(0, x)
         y = min(0, y)
         x = max(-(self.width - WIDTH // 2), x)
         y = max(-(self.height - HEIGHT), y)
 
+        self.moved = self.view.topleft != (-x, -y)
         self.camera = pg.Rect(x, y, self.width, self.height)
+        self.view.topleft = (-x, -y)
 
 class Screen:
     """ Screen object for blitting to. Works nicely for passing to a sprite object, for a dedicated screen per player sprite. 
@@ -123,8 +472,15 @@ class Screen:
         The surface of the screen.
     rect : pygame.Rect
         The rectangle of the surface.
+    max_rects : int
+        If more areas than this changed in a frame they are merged into one rect. (default 32)
+
+    Methods
+    -------
+    present(display, dirty, full=False)
+        Blit the changed parts of surf to display.
     """
-    def __init__(self, x, y, w, h):
+    def __init__(self, x, y, w, h, max_rects=32):
         """
         Args
         ----
@@ -136,6 +492,55 @@ class Screen:
             Width.
         h : int 
             Height.
+        max_rects : int
+            Maximum number of separate rects to present. (default 32)
         """
         self.surf = pg.Surface((w, h), pg.SRCALPHA)
         self.rect = self.surf.get_rect(topleft=(x,y))
+        self.max_rects = max_rects
+
+        # Areas drawn to in the previous frame. These have to be presented again in the next frame to erase what was drawn there.
+        self._prev_dirty = []
+
+    def present(self, display:pg.Surface, dirty:list, full=False) -> list:
+        """ Blit the changed parts of surf to display, the areas drawn to this frame and the areas drawn to last frame.
+
+        Args
+        ----
+        display : pygame.Surface
+            Surface to blit to, the main screen.
+        dirty : list[pygame.Rect]
+            Areas of surf which were drawn to this frame.
+        full : bool
+            Blit the whole surf, e.g. when the camera scrolled. (default False)
+
+        Returns
+        -------
+        rects : list[pygame.Rect]
+            Areas of display which changed.
+        """
+        dirty = [rect for rect in dirty if rect]
+        areas = dirty + self._prev_dirty
+        self._prev_dirty = dirty
+
+        if full:
+            display.blit(self.surf, self.rect)
+            return [self.rect.copy()]
+
+        # Many small rects are slower to update than one large rect.
+        if len(areas) > self.max_rects:
+            areas = [areas[0].unionall(areas[1:])]
+
+        changed = []
+        for area in areas:
+            dest = area.move(self.rect.topleft)
+            display.blit(self.surf, dest, area)
+            changed.append(dest)
+        return changed
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Convert a map to the binary map format.")
+    parser.add_argument("src", help="map file to convert")
+    parser.add_argument("dst", help="binary map file to write")
+    args = parser.parse_args()
+    convert_map(args.src, args.dst)
@@ -0,0 +1,219 @@
+""" This module contains the PhysicsWorld class, which moves all dynamic bodies of the game in one vectorized step per tick, and the Body class which
+gives a sprite a body in a world.
+
+A tick has three phases. First every sprite updates, deciding on the forces on its body, e.g. thrust, and if gravity applies. Then the world integrates all
+bodies at once. Last every body reads its new position back into its rect and checks for collisions in after_step(). Bodies added during a tick start
+moving on the next one, like sprites added during pygame.sprite.Group.update() are first updated on the next one. Bodies removed during a tick finish it,
+and keep their state until the next tick begins.
+"""
+
+import pygame as pg
+import numpy as np
+from config import *
+
+vec = pg.math.Vector2
+
+class PhysicsWorld:
+    """ Positions, velocities and accelerations of all dynamic bodies, stored in contiguous NumPy arrays with one row per body. Rows of removed bodies are
+    reused by new ones, and the arrays double in size when full.
+
+    Attributes
+    ----------
+    pos : numpy.ndarray
+        Positions of bodies, shape (capacity, 2).
+    prev_pos : numpy.ndarray
+        Positions before the latest step, shape (capacity, 2). Used to interpolate when drawing.
+    vel : numpy.ndarray
+        Velocities of bodies, shape (capacity, 2).
+    acc : numpy.ndarray
+        Accelerations applied to bodies during the next step, besides gravity, shape (capacity, 2). Cleared by each step.
+    gravity : numpy.ndarray
+        1 for bodies pulled by gravity during the next step, otherwise 0, shape (capacity,).
+    alive : numpy.ndarray
+        True for rows holding a body, shape (capacity,).
+    moving : numpy.ndarray
+        True for rows moved by the next step, shape (capacity,).
+
+    Methods
+    -------
+    add(pos, vel=(0, 0), gravity=False)
+        Add a body and return its row.
+    remove(body)
+        Remove a body when the tick ends.
+    begin()
+        Start a tick.
+    step(dt)
+        Integrate all moving bodies.
+    """
+    def __init__(self, capacity=PHYSICS_CAPACITY):
+        """
+        Args
+        ----
+        capacity : int
+            Number of bodies the arrays hold before growing. (default PHYSICS_CAPACITY)
+        """
+        self.pos = np.zeros((capacity, 2))
+        self.prev_pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.acc = np.zeros((capacity, 2))
+        self.gravity = np.zeros(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.moving = np.zeros(capacity, dtype=bool)
+
+        # Free rows, the lowest is used first so bodies stay packed at the start of the arrays. Removed rows are freed when the next tick begins.
+        self._free = list(range(capacity - 1, -1, -1))
+        self._removed = []
+
+    def _grow(self) -> None:
+        """ Double the capacity of the arrays. """
+        capacity = len(self.alive)
+        for name in ("pos", "prev_pos", "vel", "acc", "gravity", "alive", "moving"):
+            old = getattr(self, name)
+            new = np.zeros((2 * capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+        self._free = list(range(2 * capacity - 1, capacity - 1, -1)) + self._free
+
+    def add(self, pos, vel=(0, 0), gravity=False) -> int:
+        """ Add a body. It starts moving on the next tick.
+
+        Args
+        ----
+        pos : pygame.math.Vector2|tuple
+            Starting position.
+        vel : pygame.math.Vector2|tuple
+            Starting velocity. (default (0, 0))
+        gravity : bool
+            Pull the body by gravity. (default False)
+
+        Returns
+        -------
+        body : int
+            Row of the body in the arrays.
+        """
+        if not self._free:
+            self._grow()
+        body = self._free.pop()
+
+        self.pos[body] = pos
+        self.prev_pos[body] = pos
+        self.vel[body] = vel
+        self.acc[body] = 0
+        self.gravity[body] = gravity
+        self.alive[body] = True
+        self.moving[body] = False
+        return body
+
+    def remove(self, body:int) -> None:
+        """ Remove a body. It is moved until the tick ends, and its row is reused after.
+
+        Args
+        ----
+        body : int
+            Row of the body.
+        """
+        if self.alive[body] and body not in self._removed:
+            self._removed.append(body)
+
+    def begin(self) -> None:
+        """ Start a tick. Rows of removed bodies are freed, and the bodies added since the previous tick begin to move. """
+        for body in self._removed:
+            self.alive[body] = False
+            self._free.append(body)
+        if self._removed:
+            self._free.sort(reverse=True)
+            self._removed = []
+
+        np.copyto(self.moving, self.alive)
+
+    def step(self, dt:float) -> None:
+        """ Integrate all moving bodies with the Euler-Cromer method: velocity first, then position with the new velocity. Accelerations are cleared.
+
+        Args
+        ----
+        dt : float
+            Time step in seconds.
+        """
+        i = np.flatnonzero(self.moving)
+        acc = self.acc[i]
+        acc[:, 1] += self.gravity[i] * GRAVITY_MAG
+
+        self.prev_pos[i] = self.pos[i]
+        self.vel[i] += acc * dt
+        self.pos[i] += self.vel[i] * dt
+        self.acc[i] = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.alive))
+
+class Body:
+    """ Mixin for sprites with a body in a PhysicsWorld. The position, velocity and acceleration of the body are read and written as
+    pygame.math.Vector2, copies of its rows in the world.
+
+    Attributes
+    ----------
+    world : PhysicsWorld
+        World of the body.
+    body : int
+        Row of the body in world.
+    pos, prev_pos, vel, acc : pygame.math.Vector2
+        Position, position before the latest step, velocity and acceleration of the body.
+
+    Methods
+    -------
+    add_body(world, pos, vel=(0, 0), gravity=False)
+        Give the sprite a body in world.
+    after_step(walls)
+        Called after the world has moved all bodies.
+    sync_rect()
+        Center the rect of the sprite on its body.
+    """
+    def add_body(self, world:PhysicsWorld, pos, vel=(0, 0), gravity=False) -> None:
+        """ Give the sprite a body in world. See PhysicsWorld.add. """
+        self.world = world
+        self.body = world.add(pos, vel, gravity)
+
+    @property
+    def pos(self) -> vec:
+        return vec(self.world.pos[self.body].tolist())
+
+    @pos.setter
+    def pos(self, value) -> None:
+        self.world.pos[self.body] = value
+
+    @property
+    def prev_pos(self) -> vec:
+        return vec(self.world.prev_pos[self.body].tolist())
+
+    @prev_pos.setter
+    def prev_pos(self, value) -> None:
+        self.world.prev_pos[self.body] = value
+
+    @property
+    def vel(self) -> vec:
+        return vec(self.world.vel[self.body].tolist())
+
+    @vel.setter
+    def vel(self, value) -> None:
+        self.world.vel[self.body] = value
+
+    @property
+    def acc(self) -> vec:
+        return vec(self.world.acc[self.body].tolist())
+
+    @acc.setter
+    def acc(self, value) -> None:
+        self.world.acc[self.body] = value
+
+    def after_step(self, walls) -> None:
+        """ Called after the world has moved all bodies, by default only centers the rect on the body. """
+        self.sync_rect()
+
+    def sync_rect(self) -> None:
+        """ Center the rect of the sprite on its body. """
+        self.rect.center = self.world.pos[self.body].tolist()
+
+    def kill(self) -> None:
+        """ Remove the sprite from all groups and its body from the world. """
+        super().kill()
+        self.world.remove(self.body)
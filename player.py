@@ -1,11 +1,14 @@
 """ This module contains the Player class which is the main character of the game implementation. """
 
+import math
 from sprites import *
-from effects import SmokeParticle, Explotion, LaserBeam
 from controller import Controller
+from spatial import TileGrid, LevelMask
+from textures import rotate_img
+from physics import Body
 
-class Player(MayhemSprite):
-    """ Player sprite. The player is the main sprite which has registered controls, animations, a score and the ability to take out other players. Has parent class MayhemSprite.
+class Player(Body, MayhemSprite):
+    """ Player sprite. The player is the main sprite which has registered controls, animations, a score and the ability to take out other players. Has parent classes Body and MayhemSprite.
     
     Attributes
     ----------
@@ -22,20 +25,26 @@ class Player(MayhemSprite):
     player_n : int
         Player number. Either 1 for player 1 or 2 for player 2.
     pos, vel, acc, rot: pygame.Vector2, pygame.Vector2, pygame.Vector2, int
-        Attributes which keep track of the spatial parameters.
+        Attributes which keep track of the spatial parameters. pos, vel and acc are kept by the body of the player in the games PhysicsWorld.
+    prev_pos : pygame.Vector2
+        Position before the latest update. Used to interpolate when drawing.
     landed : bool
         Attribute to keep track of if the spacecraft has landed. (default True)
     thrust: bool
         Attribute to keep track of if the spacecraft is applying thrust. (default False)
-    prev_shot : bool
-        Attribute to keep track of the previous time when the spacecraft shot it's laser gun. (defaul 0)
+    prev_shot : float
+        Attribute to keep track of the previous time when the spacecraft shot it's laser gun, in game time. (default -inf, the first shot is allowed at once)
     exploded : bool
         Attribute to keep track of if the spacecraft has exploded. (defaul False)
+    half_size : pygame.Vector2
+        Half the size of the visible spacecraft in its texture, the rectangle lasers hit when rotated by rot.
 
     Methods
     -------
     update(walls)
-        updates object once per frame
+        updates controls and forces once per tick, before the physics world moves the player.
+    after_step(walls)
+        checks for collisions once per tick, after the physics world has moved the player.
     up()
         method for what happens when a up key is pressed.
     down()
@@ -44,8 +53,12 @@ class Player(MayhemSprite):
         method for what happens when a left key is pressed.
     right()
         method for what happens when a right key is pressed.
+    reset(game, controls, x, y, textures, player_n, screen)
+        start a new life, as if the player was just made.
     kill(reason)
-        method that when called removes sprite from any groups. Also this method has been extended to command game object to respawn a new player object.
+        method that when called removes sprite from any groups. Also this method has been extended to explode and to command game object to respawn a new player object.
+    observe()
+        Observation of the game from this player, given to the policy of a PolicyInput.
     rotate_img(img, angle)
         Rotates image by given angle.
     """
@@ -82,72 +95,98 @@ class Player(MayhemSprite):
         self.current_texture = textures[0]
         w, h = self.current_texture.get_rect().size
 
-        # super the MayhemSprite class.
-        super().__init__([game.all_sprites, game.all_players], x, y, w, h, texture=self.current_texture)
+        # super the MayhemSprite class, the player is added to the groups of the game when reset.
+        super().__init__([], x, y, w, h, texture=self.current_texture)
+        self.fuel = None
+        self.reset(game, controls, x, y, textures, player_n, screen)
 
-        # Keep track of game, dedicated screen, fuel, and controller
+    def reset(
+            self,
+            game: object,
+            controls: Controller,
+            x: int,
+            y: int,
+            textures: dict,
+            player_n: int,
+            screen: pg.Surface
+            ) -> None:
+        """ Start a new life, as if the player was just made. Dead players are reused by the games SpritePool this way, takes the same arguments as Player(). """
+
+        # Set current texture to the static spaceship graphic, at the start position.
+        self.textures = textures
+        self.current_texture = self.texture = self.image = textures[0]
+        self.rect.size = self.image.get_size()
+        self.x, self.y = x, y
+        self.rect.topleft = (x * TILESIZE, y * TILESIZE)
+        self.add(game.all_sprites, game.all_players, game.all_bodies)
+
+        # Keep track of game, dedicated screen, fuel, and controller. The fuel tank of a dead player is refilled.
         self.game = game
         self.screen = screen
-        self.fuel = FuelTank(self)
+        if self.fuel is None:
+            self.fuel = FuelTank(self)
+        else:
+            self.fuel.reset(self)
         self.controller = controls
         self.player_n = player_n
 
-        # Positional attributes.
-        self.pos = vec(self.rect.center)
-        self.vel = vec(0, 0)
-        self.acc = vec(0, 0)
+        # Positional attributes. Position, velocity and acceleration are kept by the physics world.
+        self.add_body(game.physics, self.rect.center)
         self.rot = 0
 
+        # Lasers hit the visible part of the texture, which is centered in it.
+        self.half_size = vec(self.current_texture.get_bounding_rect().size) / 2
+
         # Other attributes.
         self.landed = True
         self.thrust = False
-        self.prev_shot = 0
+        self.prev_shot = -math.inf
         self._configure_controls()
         self.exploded = False
 
-    def update(self, walls: pg.sprite.Group) -> None:
-        """ Generic pygame sprite required update method for updating sprite on a per frame basis.
+    def update(self, walls: "TileGrid|LevelMask") -> None:
+        """ Generic pygame sprite required update method for updating sprite on a per tick basis. Decides on the forces on the player, the physics world
+        then moves it.
         
         Args:
-            walls: pygame.sprite.Group
-                Game spritegroup containing all walls used in active instance of game.
+            walls: TileGrid|LevelMask
+                Collision index containing all walls used in active instance of game.
         """
 
-        # Set thrust to False every frame and reset acceleration.
+        # Set thrust to False every tick. The acceleration was reset by the previous step of the physics world.
         self.thrust = False
-        self.acc = vec(0, 0)
 
         # Force controller to register our keystrokes with predefined methods for the different possible movement vectors.
         self.controller.register_keystrokes()
 
-        # Check if landed and if hit by projectile and also select what texture to blit.
+        # Check if landed and also select what texture to blit. Lasers check if they hit a player, see LaserBeam.
         self._check_landed()
-        self._hit_by_projectile()
         self._apply_gravity()
         img = self._select_texture()
 
-        # Set the image, and mask to the output of rotate_img method.
-        self.image, _, self.mask = self.rotate_img(img, self.rot)
+        # Set the image, and mask to the rotated image and mask from the games rotation cache.
+        self.image, _, self.mask = self.game.rotations.get(img, self.rot)
 
-        # Use Euler-cromer differential equation solver for estimating a solution for position relative to velocity and acceleration vector.
+    def after_step(self, walls: "TileGrid|LevelMask") -> None:
+        """ Called once per tick after the physics world has moved the player.
 
-        self.vel += self.acc * self.game.dt
-        self.pos += self.vel * self.game.dt
-        self.rect.center = self.pos
-        
-        # Check for impacts with walls, if player should explode and if player should refuel.
+        Args:
+            walls: TileGrid|LevelMask
+                Collision index containing all walls used in active instance of game.
+        """
+        self.sync_rect()
+
+        # Check for impacts with walls and if player should refuel.
 
         self._impact(walls)
-        self._if_explode()
         self._refuel()
 
     def _apply_gravity(self) -> None:
-        """ Method for applying gravity. """
+        """ Method for applying gravity. The physics world pulls the player by GRAVITY_MAG during the next step. """
         
         # As we do not want the player to slowly fall throught the floor we only apply gravity when player is not landed and thus is airborne.
 
-        if not self.landed:
-            self.acc += vec(0, 1) * GRAVITY_MAG
+        self.world.gravity[self.body] = not self.landed
 
     def _select_texture(self) -> pg.Surface:
         """ Method for animating sprite. 
@@ -177,48 +216,38 @@ class Player(MayhemSprite):
         if self.vel != vec(0, 0):
             self.landed = False
 
-    def _impact(self, walls: pg.sprite.Group) -> None:
+    def _impact(self, walls: "TileGrid|LevelMask") -> None:
         """ Check if self collide with blocks, if collision detected and it is not a landing pad, kill sprite.
         
         Args:
-            walls: pygame.sprite.Group
-                Group object containing all walls.
+            walls: TileGrid|LevelMask
+                Collision index containing all walls.
         """
 
-        collidewall = []
-
-        for wall in walls:
+        # Check if our mask overlaps with any landing pad or any other wall.
+        # Note that blocks dont need to update masks, however a sprite which rotates would have to update its mask to its rotation,
+        # as the mask attribute is only a array of pixels which make a hitbox by differentiating transparent pixels from filled ones.
 
-            # Check if masks overlap. Add to list of walls which are collided with
-            # The collide_mask function calculates a new mask for each time the function is called unless object has mask assigned to it.
-            # Note that blocks dont need to update masks, however a sprite which rotates would have to update its mask to its rotation,
-            # as the mask attribute is only a array of pixels which make a hitbox by differentiating transparent pixels from filled ones.
-
-            if pg.sprite.collide_mask(self, wall):
-                collidewall.append(wall)
-
-        # Gather all walls texture id´s in a array
-        ids = np.array([wall.texture_id for wall in collidewall])
+        on_pad, on_wall = walls.touches(self)
         
         # Need to see if any of the blocks which have been collided with are either a "l" for landing platform or something else.
         # Because a mask or rect can collide with multiple blocks at once the program checks to see if any of the collided with blocks
         # are landing pads.
 
-        if len(ids) > 0:
-            if np.any(ids == "l"):
+        if on_pad:
 
-                # if speed in y direction is larger than 500 we kill the sprite.
+            # if speed in y direction is larger than 500 we kill the sprite.
 
-                if self.vel[1] > 200:
-                    self.kill(reason="wall")
+            if self.vel[1] > 200:
+                self.kill(reason="wall")
 
-                # Set velocity to the zero vector to "turn off" the gravity.
+            # Set velocity to the zero vector to "turn off" the gravity.
 
-                self.vel = vec(0,0)
-                self.rot = 0
-                self.landed = True
-            else:
-                self.kill(reason="wall")
+            self.vel = vec(0,0)
+            self.rot = 0
+            self.landed = True
+        elif on_wall:
+            self.kill(reason="wall")
 
     def up(self) -> None:
         """ Method for moving up. This method does a couple of important things:
@@ -226,7 +255,7 @@ class Player(MayhemSprite):
         1. Check that fuel tank is not empty
         2. Apply a acceleration to the heading of the spacecraft.
         3. Set thrust attribute to True.
-        4. Call on method _exhaust, which creates the SmokeParticle objects.
+        4. Call on method _exhaust, which emits smoke particles.
         5. Call on method _use_fuel, which drains the fuel tank.
         """
 
@@ -260,96 +289,75 @@ class Player(MayhemSprite):
             up=self.up,
             left=self.left,
             right=self.right,
-            down=self.down
+            down=self.down,
+            observe=self.observe
         )
 
+    def observe(self) -> dict:
+        """ Observation of the game from this player, given to the policy of a PolicyInput.
+
+        Returns
+        -------
+        observation : dict
+            "pos", "vel" and "rot" of this player, its "fuel" and if it has "landed", and "opponent_pos" and "opponent_vel" of the other player.
+        """
+        opponent = self.game.player2 if self.player_n == 1 else self.game.player1
+        return {
+            "pos": tuple(self.pos),
+            "vel": tuple(self.vel),
+            "rot": self.rot,
+            "fuel": self.fuel.amount,
+            "landed": self.landed,
+            "opponent_pos": tuple(opponent.pos),
+            "opponent_vel": tuple(opponent.vel),
+        }
+
     def _exhaust(self) -> None:
-        """ Method for creating smoke when thrust is active by instantiating the SmokeParticle class. """
+        """ Method for creating smoke when thrust is active by emitting a particle in the games SmokeSystem. """
 
         # Calculate the starting posistion of the smoke as the bottom of the sprite plus some margin, then rotated by the rotation of the sprite.
 
         smoke_pos = self.pos + vec(0, self.rect.height * 0.75).rotate(-self.rot)
 
-        # Calculate smoke starting velocity as the negative rotation and make it as a vector for the SmokeParticle vel parameter.
+        # Calculate smoke starting velocity as the negative rotation and make it as a vector for the vel parameter of the particle.
 
         smoke_vel = vec(0,1).rotate(-self.rot)
 
-        # Create a new smoke sprite object.
+        # Emit a new smoke particle.
 
-        SmokeParticle(self.game, smoke_pos, smoke_vel)
+        self.game.smoke.emit(smoke_pos, smoke_vel)
 
     def _shoot(self) -> None:
-        """ Method for shooting. Instantiates a LaserBeam object. """
+        """ Method for shooting. Takes a LaserBeam object from the games pool. """
 
         # Check if time from previous shot is less than SPRITE_LOAD_DURATION, if yes; instantiate LaserBeam object and reset time of last shot.
 
-        if pg.time.get_ticks() / 1000 - self.prev_shot > SPRITE_LOAD_DURATION:
-            LaserBeam(self, self.game, self.pos - vec(0, self.rect.height / 2).rotate(-self.rot), -self.rot)
-            self.prev_shot = pg.time.get_ticks() / 1000
+        # Game time is used rather than wall clock time, so the reload duration is the same when the game is simulated faster than real time.
+
+        if self.game.t - self.prev_shot > SPRITE_LOAD_DURATION:
+            self.game.laser_pool.acquire(self, self.game, self.pos - vec(0, self.rect.height / 2).rotate(-self.rot), -self.rot)
+            self.prev_shot = self.game.t
 
     def _if_explode(self) -> None:
         """ Method for checking if player has been killed and if yes then make a explotion object. """
 
-        # If player is not alive and has not already exploded, then instantiate a Explotion object.
+        # If player is not alive and has not already exploded, then take a Explotion object from the games pool.
         if not self.alive() and not self.exploded:
-            Explotion(self.game, self.pos)
-
-    def _hit_by_projectile(self) -> None:
-        """ Method for checking if player collide with any laser. """
-
-        # Get list of collided lasers.
-
-        laser = pg.sprite.spritecollideany(self, self.game.all_projectiles)
-
-        # If no collision detected spritecollideany returns None, threfore early exit if no laser collision.
-
-        if laser is None:
-            return
-
-        # Each laser object has a sender attribute to check that we dont register collisions between laser and player when player shoots and rectangles probably overlap in some rotations.
-        
-        if laser.sender != self:
-                self.kill(reason="shot")
+            self.game.explotion_pool.acquire(self.game, self.pos)
+            self.exploded = True
 
     def _get_reset_point(self) -> pg.Rect:
-        """ Method for finding a respawn point - the landing pad the furthest away from the opponent.
+        """ Method for finding a respawn point - the landing pad the furthest away from the opponents.
         
         Returns:
             pg.Rect
-                Landing pad furthest away from opponent.
+                Landing pad furthest away from the nearest opponent.
         """
-        
-        opponent = None
-
-        # Iterate through registered players in game
-
-        for player in self.game.all_players:
 
-            # set opponent to player if not self.
+        # The landing pads are indexed when the level is built, so only the positions of the opponents are needed.
 
-            if player != self:
-                opponent = player
-
-        
-        furthest_lp = None
-        dist = 0
-        
-        # Iterate over all wall sprites and look for the ones with texture id as "l" for landing pad.
-
-        for wall in self.game.all_walls:
-            if wall.texture_id == "l":
-
-                # Find the distance between opponent and each candidate landing pad.
-
-                calc_dist = vec(wall.rect.center).distance_to(vec(opponent.rect.center))
-                
-                # Choose closest one.
-
-                if calc_dist > dist:
-                    furthest_lp = wall
-                    dist = calc_dist
-
-        return furthest_lp.rect
+        opponents = [player.rect.center for player in self.game.all_players if player != self]
+        return self.game.landing_pads.safest(opponents)
 
     def kill(self, reason: str) -> None:
         """ Modify the standard kill method of sprites to also run a code block in game which respawns a new player. 
@@ -360,8 +368,17 @@ class Player(MayhemSprite):
             Why was the player killed, either 'shot' or 'wall'.
         """
       
+        # A player can be hit by a laser and a wall in the same tick, but only dies once.
+        if not self.alive():
+            return
+
+        # Players can be killed by lasers after their own update, so they explode right away. The respawned player is another one, this one is reused
+        # for a later respawn.
         super().kill()
+        self.fuel.kill()
+        self._if_explode()
         self.game.respawn(self.player_n, self._get_reset_point(), reason)
+        self.game.player_pool.release(self)
 
     def _use_fuel(self) -> None:
         """ When thrusting we subtract one fuel entity. """
@@ -394,9 +411,4 @@ class Player(MayhemSprite):
         new_mask : pygame.mask.Mask
         """
 
-        old_center = img.get_rect().center
-        rot_img = pg.transform.rotate(img, angle)
-        rot_img.set_colorkey(GREEN)
-        new_rect = rot_img.get_rect(center=old_center)
-        new_mask = pg.mask.from_surface(rot_img)
-        return rot_img, new_rect, new_mask
+        return rotate_img(img, angle)
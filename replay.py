@@ -0,0 +1,254 @@
+""" Recording and replaying of matches. A replay holds the action bitmasks of both players for every tick, the seed of the random module and the map,
+which is all it takes to simulate the match again: the game is updated with a fixed time step, so the same actions give the same match. A replay also holds
+the final Scoreboard, and playing it checks that the match still ends the same, which makes replays regression tests of changes to the physics.
+
+Replay file layout, little endian:
+    header: magic b"MAYR", version (uint16), seed (uint64), ticks (uint32), crc32 of map grid (uint32), length of map name (uint16)
+    map name, utf-8
+    actions: one byte per tick, the bitmask of player 1 in the low and of player 2 in the high four bits
+    scoreboard: score, kills and wall deaths of player 1 and 2 (6 x int32)
+
+Usage: python3 main.py --record match.rep [--seed 0], then python3 main.py --replay match.rep [--headless]
+"""
+
+import os
+import zlib
+import struct
+import random
+
+import numpy as np
+from controller import RecordedInput
+
+REPLAY_MAGIC = b"MAYR"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sHQIIH")
+REPLAY_SCOREBOARD = struct.Struct("<6i")
+
+class RecordingInput:
+    """ Input source passing on the actions of another source and keeping a log of them, one bitmask per tick.
+
+    Attributes
+    ----------
+    source : KeyboardInput|RecordedInput|PolicyInput
+        Where the actions come from.
+    log : bytearray
+        Bitmasks of the actions so far.
+
+    Methods
+    -------
+    actions(observe)
+        Return and log the bitmask of the source.
+    """
+    def __init__(self, source):
+        """
+        Args
+        ----
+        source : KeyboardInput|RecordedInput|PolicyInput
+            Where the actions come from.
+        """
+        self.source = source
+        self.log = bytearray()
+
+    def actions(self, observe) -> int:
+        """ Return and log the bitmask of the source.
+
+        Args
+        ----
+        observe : callable
+            Passed on to the source.
+
+        Returns
+        -------
+        actions : int
+            Bitmask of UP, LEFT, RIGHT and DOWN.
+        """
+        actions = self.source.actions(observe)
+        self.log.append(actions)
+        return actions
+
+class Replay:
+    """ Recorded match.
+
+    Attributes
+    ----------
+    seed : int
+        Seed of the random module during the match.
+    map_file : str
+        Map of the match, relative to the game directory.
+    map_crc : int
+        crc32 of the map grid, to tell if the map has changed since recording.
+    ticks : int
+        Number of ticks of the match.
+    actions1, actions2 : bytes, bytes
+        Bitmask of the actions of player 1 and 2 for every tick.
+    scores : dict
+        Final scores, see Scoreboard.
+    stats : dict
+        Final kills and wall deaths, see Scoreboard.
+
+    Methods
+    -------
+    start(game, seed)
+        Reset game to the start of a match and record it.
+    stop(game)
+        Return the replay of the match recorded by game.
+    save(path)
+        Write replay to file.
+    load(path)
+        Read replay from file.
+    play(game)
+        Simulate the match again in game.
+    matches(scoreboard)
+        Check if a scoreboard has the outcome of the replay.
+    """
+    def __init__(self, seed:int, map_file:str, map_crc:int, ticks:int, actions1:bytes, actions2:bytes, scores:dict, stats:dict):
+        self.seed = seed
+        self.map_file = map_file
+        self.map_crc = map_crc
+        self.ticks = ticks
+        self.actions1 = bytes(actions1)
+        self.actions2 = bytes(actions2)
+        self.scores = scores
+        self.stats = stats
+
+    @staticmethod
+    def _begin(game, seed:int) -> None:
+        """ Reset game to the start of a match. Resetting with 'r' is turned off, as the replay would not know about it. """
+        random.seed(seed)
+        game.t = 0
+        game.step_count = 0
+        game.new()
+        game.resethandler.handler = game.keypress_handler
+
+    @staticmethod
+    def start(game, seed=0) -> None:
+        """ Reset game to the start of a match and record the actions of both controllers from now on.
+
+        Args
+        ----
+        game : Main
+            Game to record.
+        seed : int
+            Seed of the random module. (default 0)
+        """
+        Replay._begin(game, seed)
+        game.replay_seed = seed
+        game.controller1.source = RecordingInput(game.controller1.source)
+        game.controller2.source = RecordingInput(game.controller2.source)
+
+    @classmethod
+    def stop(cls, game) -> "Replay":
+        """ Return the replay of the match recorded by game since start().
+
+        Args
+        ----
+        game : Main
+            Recorded game.
+
+        Returns
+        -------
+        replay : Replay
+            Actions of every tick so far and the current scoreboard.
+        """
+        scoreboard = game.scoreboard
+        return cls(
+            game.replay_seed, os.path.relpath(game.map_file, game.path), zlib.crc32(game.map.grid.tobytes()), game.step_count,
+            game.controller1.source.log, game.controller2.source.log,
+            dict(scoreboard.scores), {n: dict(s) for n, s in scoreboard.stats.items()},
+        )
+
+    def save(self, path:str) -> None:
+        """ Write replay to file.
+
+        Args
+        ----
+        path : str
+            Path to replay file.
+        """
+        name = self.map_file.replace(os.sep, "/").encode("utf-8")
+
+        # Both players fit in one byte per tick. Players are polled once per tick, but pad the shorter log in case one was not.
+        actions = np.zeros(self.ticks, np.uint8)
+        for shift, log in ((0, self.actions1), (4, self.actions2)):
+            log = np.frombuffer(log, np.uint8)[:self.ticks]
+            actions[:len(log)] |= (log & 0xF) << shift
+
+        with open(path, "wb") as f:
+            f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.ticks, self.map_crc, len(name)))
+            f.write(name)
+            f.write(actions.tobytes())
+            f.write(REPLAY_SCOREBOARD.pack(
+                self.scores["1"], self.stats["1"]["kills"], self.stats["1"]["wall_deaths"],
+                self.scores["2"], self.stats["2"]["kills"], self.stats["2"]["wall_deaths"],
+            ))
+
+    @classmethod
+    def load(cls, path:str) -> "Replay":
+        """ Read replay from file.
+
+        Args
+        ----
+        path : str
+            Path to replay file.
+
+        Returns
+        -------
+        replay : Replay
+            The replay.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+
+        magic, version, seed, ticks, map_crc, length = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a replay file of version {REPLAY_VERSION}")
+
+        offset = REPLAY_HEADER.size
+        map_file = data[offset:offset + length].decode("utf-8")
+        offset += length
+        actions = np.frombuffer(data, np.uint8, ticks, offset)
+        offset += ticks
+        score1, kills1, walls1, score2, kills2, walls2 = REPLAY_SCOREBOARD.unpack_from(data, offset)
+
+        return cls(
+            seed, map_file, map_crc, ticks, (actions & 0xF).tobytes(), (actions >> 4).tobytes(),
+            {"1": score1, "2": score2},
+            {"1": {"kills": kills1, "wall_deaths": walls1}, "2": {"kills": kills2, "wall_deaths": walls2}},
+        )
+
+    def play(self, game) -> bool:
+        """ Simulate the match again in game, as fast as possible if it is headless, otherwise at the normal speed of the game.
+
+        Args
+        ----
+        game : Main
+            Game made with the map of the replay.
+
+        Returns
+        -------
+        matches : bool
+            True if the match ended with the same scoreboard as recorded.
+        """
+        if zlib.crc32(game.map.grid.tobytes()) != self.map_crc:
+            raise ValueError(f"{self.map_file} has changed since the replay was recorded")
+
+        self._begin(game, self.seed)
+        game.controller1.source = RecordedInput(self.actions1)
+        game.controller2.source = RecordedInput(self.actions2)
+        game.run(steps=self.ticks)
+        return self.matches(game.scoreboard)
+
+    def matches(self, scoreboard) -> bool:
+        """ Check if a scoreboard has the outcome of the replay.
+
+        Args
+        ----
+        scoreboard : Scoreboard
+            Scoreboard at the end of a match.
+
+        Returns
+        -------
+        matches : bool
+            True if scores, kills and wall deaths are equal.
+        """
+        return scoreboard.scores == self.scores and scoreboard.stats == self.stats
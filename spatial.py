@@ -0,0 +1,791 @@
+""" This module contains spatial indexes used to speed up collision detection. The TileGrid class maps tile positions to the walls occupying them so that
+a sprite only has to be tested against the few tiles its rectangle overlaps instead of every wall in the level. The LevelMask class merges the masks of all
+walls into one mask for the whole level, so a collision test is a single Mask.overlap call. The SpriteHash class buckets moving sprites by position so that
+the sprites inside a rectangle, e.g. the visible window of a camera, can be found without scanning every sprite. The PadIndex class keeps the landing pads
+of a level for choosing where to respawn.
+
+TileGrid and LevelMask both have a touches(sprite) method and can be used interchangeably for collision detection against walls. Fast sprites, which may pass through a
+wall between two updates, sweep the segment they moved along through the TileGrid with cast(start, end), which visits the tiles along it with
+traverse_tiles(), and test it against rotated sprites with segment_hits_box().
+"""
+
+import pygame as pg
+import numpy as np
+from config import *
+
+vec = pg.math.Vector2
+
+# Symbol of every tile id, used to turn tile ids into symbols for a whole array at once.
+SYMBOLS = np.array([chr(code) for code in range(256)], dtype=object)
+
+def classify_tiles(grid:np.ndarray, tiles) -> np.ndarray:
+    """ Find the walls in a grid of tile ids.
+
+    Args
+    ----
+    grid : numpy.ndarray
+        Tile ids of shape (rows, columns), see Map.grid.
+    tiles : iterable[str]
+        Symbols of the tiles that are walls.
+
+    Returns
+    -------
+    is_wall : numpy.ndarray
+        Boolean array of the same shape as grid, True where the tile is a wall.
+    """
+    lookup = np.zeros(256, dtype=bool)
+    lookup[[ord(tile) for tile in tiles]] = True
+    return lookup[np.asarray(grid)]
+
+def wall_runs(grid:np.ndarray, tiles) -> tuple:
+    """ Find the horizontal runs of identical walls in a grid of tile ids, so that a run can be handled as one piece instead of tile by tile.
+
+    Args
+    ----
+    grid : numpy.ndarray
+        Tile ids of shape (rows, columns), see Map.grid.
+    tiles : iterable[str]
+        Symbols of the tiles that are walls.
+
+    Returns
+    -------
+    rows, columns, lengths : numpy.ndarray, numpy.ndarray, numpy.ndarray
+        Position of the first tile and number of tiles of each run, row by row.
+    symbols : numpy.ndarray
+        Symbol of the walls of each run.
+    """
+    grid = np.asarray(grid)
+    is_wall = classify_tiles(grid, tiles).ravel()
+
+    # A run starts where the tile differs from the tile to its left, and every row starts a new run. It ends where the next run, of any tile, starts.
+    change = np.ones(grid.shape, dtype=bool)
+    change[:, 1:] = grid[:, 1:] != grid[:, :-1]
+    starts = np.flatnonzero(change)
+    ends = np.append(starts[1:], grid.size)
+
+    walls = is_wall[starts]
+    starts = starts[walls]
+    rows, columns = np.divmod(starts, grid.shape[1])
+    return rows, columns, ends[walls] - starts, SYMBOLS[grid.ravel()[starts]]
+
+def traverse_tiles(start, end):
+    """ Yield the tiles a line segment crosses, in order from start to end (DDA grid traversal). Tiles outside the map are yielded too.
+
+    Args
+    ----
+    start, end : pygame.math.Vector2|tuple, pygame.math.Vector2|tuple
+        End points of the segment in level coordinates.
+
+    Yields
+    ------
+    column, row, t : int, int, float
+        Tile position, and the fraction 0 <= t <= 1 of the segment where it enters the tile.
+    """
+    x0, y0 = start
+    x1, y1 = end
+    dx, dy = x1 - x0, y1 - y0
+    column, row = int(x0 // TILESIZE), int(y0 // TILESIZE)
+    end_column, end_row = int(x1 // TILESIZE), int(y1 // TILESIZE)
+
+    # For each axis, the fraction of the segment where it crosses the next tile border, and the fraction between two borders.
+    step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+    next_x = ((column + (dx > 0)) * TILESIZE - x0) / dx if dx else float("inf")
+    next_y = ((row + (dy > 0)) * TILESIZE - y0) / dy if dy else float("inf")
+    delta_x = TILESIZE / abs(dx) if dx else float("inf")
+    delta_y = TILESIZE / abs(dy) if dy else float("inf")
+
+    # Step into whichever neighbouring tile the segment reaches first, until the tile of the end point.
+    t = 0
+    while t <= 1:
+        yield column, row, t
+        if column == end_column and row == end_row:
+            return
+        if next_x < next_y:
+            column += step_x
+            t = next_x
+            next_x += delta_x
+        else:
+            row += step_y
+            t = next_y
+            next_y += delta_y
+
+def segment_hits_box(start, end, center, half_size, angle:float) -> bool:
+    """ Check if a line segment intersects a rotated rectangle.
+
+    Args
+    ----
+    start, end : pygame.math.Vector2, pygame.math.Vector2
+        End points of the segment.
+    center : pygame.math.Vector2
+        Center of the rectangle.
+    half_size : tuple[float, float]
+        Half the width and height of the rectangle.
+    angle : float
+        Rotation of the rectangle in degrees, counterclockwise on screen as in pygame.transform.rotate.
+
+    Returns
+    -------
+    hit : bool
+        True if any point of the segment is inside the rectangle.
+    """
+
+    # Rotate the segment into the frame of the rectangle, where the rectangle is axis aligned.
+    a = (vec(start) - center).rotate(angle)
+    b = (vec(end) - center).rotate(angle)
+
+    # Clip the segment, from t0 to t1, to the slab between the two sides of the rectangle along each axis. It misses if nothing is left.
+    t0, t1 = 0, 1
+    for axis in (0, 1):
+        d = b[axis] - a[axis]
+        h = half_size[axis]
+        if d == 0:
+            if abs(a[axis]) > h:
+                return False
+            continue
+        u0, u1 = (-h - a[axis]) / d, (h - a[axis]) / d
+        if u0 > u1:
+            u0, u1 = u1, u0
+        t0, t1 = max(t0, u0), min(t1, u1)
+        if t0 > t1:
+            return False
+    return True
+
+class TileGrid:
+    """ Tile-grid collision index. The texture id of every wall is stored at its row and column, so the walls overlapping a rectangle can be found by
+    looking up the tiles the rectangle covers. The cost of a lookup depends on the size of the rectangle, not the size of the map. All walls with the same
+    texture id share one mask, so no wall sprites are needed.
+
+    Attributes
+    ----------
+    cols : int
+        Number of columns in the grid.
+    rows : int
+        Number of rows in the grid.
+    masks : dict
+        Mask of each texture id that is a wall.
+    tiles : list[list[str|None]]
+        The grid of texture ids, indexed as tiles[row][column]. Tiles without a wall are None.
+
+    Methods
+    -------
+    add(column, row, tile)
+        Add a wall to the grid.
+    remove(column, row)
+        Remove a wall from the grid.
+    query(rect)
+        Yield the walls on the tiles overlapped by rect.
+    collide(sprite)
+        Return the walls whose masks overlap the mask of sprite.
+    touches(sprite)
+        Check if sprite overlaps any landing pad and any other wall.
+    cast(start, end)
+        Find the first wall along a line segment.
+    """
+    def __init__(self, tilemap, masks:dict):
+        """
+        Args
+        ----
+        tilemap : Map
+            Map to index.
+        masks : dict
+            Mask of each texture id that is a wall. Tiles with other symbols are empty.
+        """
+        self.cols = tilemap.mapwidth
+        self.rows = tilemap.mapheight
+        self.masks = masks
+        grid = np.asarray(tilemap.grid)
+        self.tiles = np.where(classify_tiles(grid, masks), SYMBOLS[grid], None).tolist()
+
+    def add(self, column:int, row:int, tile:str) -> None:
+        """ Add a wall to the grid.
+
+        Args
+        ----
+        column, row : int, int
+            Tile position of the wall.
+        tile : str
+            Texture id of the wall.
+        """
+        self.tiles[row][column] = tile
+
+    def remove(self, column:int, row:int) -> None:
+        """ Remove a wall from the grid.
+
+        Args
+        ----
+        column, row : int, int
+            Tile position of the wall.
+        """
+        self.tiles[row][column] = None
+
+    def query(self, rect:pg.Rect):
+        """ Yield the walls on the tiles overlapped by rect.
+
+        Args
+        ----
+        rect : pygame.Rect
+            Rectangle in level coordinates.
+
+        Yields
+        ------
+        column, row, tile : int, int, str
+            Tile position and texture id of a wall overlapped by rect.
+        """
+
+        # Find the range of tiles covered by rect, clamped to the grid. right and bottom are exclusive, hence the -1.
+        left = max(rect.left // TILESIZE, 0)
+        top = max(rect.top // TILESIZE, 0)
+        right = min((rect.right - 1) // TILESIZE, self.cols - 1)
+        bottom = min((rect.bottom - 1) // TILESIZE, self.rows - 1)
+
+        for row in range(top, bottom + 1):
+            tiles = self.tiles[row]
+            for column in range(left, right + 1):
+                tile = tiles[column]
+                if tile is not None:
+                    yield column, row, tile
+
+    def collide(self, sprite:pg.sprite.Sprite) -> list:
+        """ Return the walls whose masks overlap the mask of sprite.
+
+        Args
+        ----
+        sprite : pygame.sprite.Sprite
+            Sprite with a rect and a mask.
+
+        Returns
+        -------
+        out : list[tuple[int, int, str]]
+            Tile position and texture id of the walls collided with.
+        """
+
+        # The mask of sprite is placed at the topleft of its rect, and it may be larger than the rect (e.g. for a rotated image).
+        x, y = sprite.rect.topleft
+        area = pg.Rect((x, y), sprite.mask.get_size())
+        overlap = sprite.mask.overlap
+        return [(column, row, tile) for column, row, tile in self.query(area)
+                if overlap(self.masks[tile], (column * TILESIZE - x, row * TILESIZE - y))]
+
+    def touches(self, sprite:pg.sprite.Sprite) -> tuple[bool, bool]:
+        """ Check if sprite overlaps any landing pad and any other wall.
+
+        Args
+        ----
+        sprite : pygame.sprite.Sprite
+            Sprite with a rect and a mask.
+
+        Returns
+        -------
+        on_pad : bool
+            True if sprite overlaps a landing pad.
+        on_wall : bool
+            True if sprite overlaps a wall that is not a landing pad.
+        """
+        ids = [tile for _, _, tile in self.collide(sprite)]
+        on_pad = "l" in ids
+        return on_pad, len(ids) > ids.count("l")
+
+    def cast(self, start, end):
+        """ Find the first wall along a line segment, visiting the tiles it crosses in order. Walls fill their tiles, so the segment hits a wall where it
+        enters its tile. The cost depends on the length of the segment, not the size of the map.
+
+        Args
+        ----
+        start, end : pygame.math.Vector2, pygame.math.Vector2
+            End points of the segment in level coordinates.
+
+        Returns
+        -------
+        hit : tuple[int, int, str, float]|None
+            Tile position and texture id of the wall, and the fraction 0 <= t <= 1 of the segment where it is hit. None if the segment hits no wall.
+        """
+        for column, row, t in traverse_tiles(start, end):
+            if 0 <= row < self.rows and 0 <= column < self.cols:
+                tile = self.tiles[row][column]
+                if tile is not None:
+                    return column, row, tile, t
+        return None
+
+class LevelMask:
+    """ Merged collision mask of a whole level. The masks of all walls are drawn into one mask covering the level at their tile offsets, with a separate mask
+    for landing pads, so that checking a sprite against every wall is one or two Mask.overlap calls. Walls can be added and removed at runtime, which only
+    touches the area of that wall.
+
+    Attributes
+    ----------
+    masks : dict
+        Mask of each texture id that is a wall.
+    solid : pygame.mask.Mask
+        Mask of all walls which are not landing pads.
+    pads : pygame.mask.Mask
+        Mask of all landing pads.
+
+    Methods
+    -------
+    add(column, row, tile)
+        Draw the mask of a wall into the level mask.
+    remove(column, row, tile)
+        Erase the mask of a wall from the level mask.
+    touches(sprite)
+        Check if sprite overlaps any landing pad and any other wall.
+    """
+    def __init__(self, tilemap, masks:dict):
+        """
+        Args
+        ----
+        tilemap : Map
+            Map to merge the walls of.
+        masks : dict
+            Mask of each texture id that is a wall. Tiles with other symbols are empty.
+        """
+        self.masks = masks
+        self.solid = pg.mask.Mask((tilemap.width, tilemap.height))
+        self.pads = pg.mask.Mask((tilemap.width, tilemap.height))
+
+        # Consecutive walls with the same texture id are drawn as one mask, with one mask made for every texture id and length of run.
+        run_masks = {}
+        for row, column, length, tile in zip(*(a.tolist() for a in wall_runs(tilemap.grid, masks))):
+            key = (tile, length)
+            if key not in run_masks:
+                run_masks[key] = self._run_mask(tile, length)
+            self._target(tile).draw(run_masks[key], (column * TILESIZE, row * TILESIZE))
+
+    def _run_mask(self, tile:str, length:int) -> pg.mask.Mask:
+        """ Return the masks of length walls with texture id tile next to each other in a row, as one mask. """
+        mask = self.masks[tile]
+        w, h = mask.get_size()
+        run = pg.mask.Mask(((length - 1) * TILESIZE + w, h))
+        for i in range(length):
+            run.draw(mask, (i * TILESIZE, 0))
+        return run
+
+    def _target(self, tile:str) -> pg.mask.Mask:
+        """ Return the mask tile belongs to, the pad mask for landing pads and the solid mask for everything else. """
+        return self.pads if tile == "l" else self.solid
+
+    def add(self, column:int, row:int, tile:str) -> None:
+        """ Draw the mask of a wall into the level mask.
+
+        Args
+        ----
+        column, row : int, int
+            Tile position of the wall.
+        tile : str
+            Texture id of the wall.
+        """
+        self._target(tile).draw(self.masks[tile], (column * TILESIZE, row * TILESIZE))
+
+    def remove(self, column:int, row:int, tile:str) -> None:
+        """ Erase the mask of a wall from the level mask.
+
+        Args
+        ----
+        column, row : int, int
+            Tile position of the wall.
+        tile : str
+            Texture id of the wall.
+        """
+        self._target(tile).erase(self.masks[tile], (column * TILESIZE, row * TILESIZE))
+
+    def touches(self, sprite:pg.sprite.Sprite) -> tuple[bool, bool]:
+        """ Check if sprite overlaps any landing pad and any other wall.
+
+        Args
+        ----
+        sprite : pygame.sprite.Sprite
+            Sprite with a rect and a mask.
+
+        Returns
+        -------
+        on_pad : bool
+            True if sprite overlaps a landing pad.
+        on_wall : bool
+            True if sprite overlaps a wall that is not a landing pad.
+        """
+        offset = sprite.rect.topleft
+        on_pad = self.pads.overlap(sprite.mask, offset) is not None
+        on_wall = self.solid.overlap(sprite.mask, offset) is not None
+        return on_pad, on_wall
+
+class SpriteHash:
+    """ Spatial hash of sprites. The level is divided into square cells and every sprite is put in the cells its image covers. Finding the sprites inside a
+    rectangle only looks at the cells the rectangle covers. The hash is kept up to date incrementally: sprites are inserted when added and removed when
+    killed, see HashedGroup, and a sprite whose rect or image changed is marked with touch(). Marked sprites are moved to their new cells before the next
+    query, and only if they cover other cells than before, so sprites which stand still cost nothing.
+
+    Attributes
+    ----------
+    cell_size : int
+        Side length of a cell in pixels.
+    cells : dict
+        Maps (column, row) of a cell to a dict of {sprite: draw order} of the sprites in that cell.
+
+    Methods
+    -------
+    insert(sprite)
+        Add a sprite, drawn after the sprites already in the hash.
+    remove(sprite)
+        Remove a sprite.
+    touch(sprite)
+        Mark a sprite to be moved to the cells it covers now.
+    query(rect)
+        Return the sprites whose images intersect rect, in draw order.
+    """
+    def __init__(self, cell_size=TILESIZE * 4):
+        """
+        Args
+        ----
+        cell_size : int
+            Side length of a cell in pixels. (default TILESIZE * 4)
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+
+        # Draw order and covered cells (first column, first row, last column, last row) of every sprite, the next draw order, and the touched sprites.
+        self._orders = {}
+        self._spans = {}
+        self._next_order = 0
+        self._touched = {}
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, sprite) -> bool:
+        return sprite in self._orders
+
+    def insert(self, sprite) -> None:
+        """ Add a sprite, drawn after the sprites already in the hash. Its cells are found before the next query, so its rect and image may be set after
+        inserting it.
+
+        Args
+        ----
+        sprite : pygame.sprite.Sprite
+            Sprite to add.
+        """
+        self._orders[sprite] = self._next_order
+        self._next_order += 1
+        self._touched[sprite] = None
+
+    def remove(self, sprite) -> None:
+        """ Remove a sprite. Removing a sprite which is not in the hash does nothing.
+
+        Args
+        ----
+        sprite : pygame.sprite.Sprite
+            Sprite to remove.
+        """
+        if self._orders.pop(sprite, None) is None:
+            return
+        self._touched.pop(sprite, None)
+        span = self._spans.pop(sprite, None)
+        if span is not None:
+            self._unlink(sprite, span)
+
+    def touch(self, sprite) -> None:
+        """ Mark a sprite to be moved to the cells it covers now, because its rect or image changed. Sprites not in the hash are ignored.
+
+        Args
+        ----
+        sprite : pygame.sprite.Sprite
+            Sprite which moved or changed image.
+        """
+        if sprite in self._orders:
+            self._touched[sprite] = None
+
+    def _span(self, sprite) -> tuple:
+        """ Return the cells covered by the image of a sprite, as (first column, first row, last column, last row). """
+
+        # Use the area the image is blitted to, a rotated image can be larger than the rect of the sprite.
+        size = self.cell_size
+        x, y = sprite.rect.topleft
+        w, h = sprite.image.get_size()
+        return x // size, y // size, (x + w - 1) // size, (y + h - 1) // size
+
+    def _unlink(self, sprite, span:tuple) -> None:
+        """ Remove a sprite from the cells of span, dropping cells which become empty. """
+        c0, r0, c1, r1 = span
+        for row in range(r0, r1 + 1):
+            for column in range(c0, c1 + 1):
+                cell = self.cells[column, row]
+                del cell[sprite]
+                if not cell:
+                    del self.cells[column, row]
+
+    def _flush(self) -> None:
+        """ Move the touched sprites to the cells they cover now, if those changed. """
+        for sprite in self._touched:
+            span = self._span(sprite)
+            old = self._spans.get(sprite)
+            if span == old:
+                continue
+            if old is not None:
+                self._unlink(sprite, old)
+            self._spans[sprite] = span
+
+            order = self._orders[sprite]
+            c0, r0, c1, r1 = span
+            for row in range(r0, r1 + 1):
+                for column in range(c0, c1 + 1):
+                    self.cells.setdefault((column, row), {})[sprite] = order
+        self._touched.clear()
+
+    def query(self, rect:pg.Rect) -> list:
+        """ Return the sprites whose images intersect rect, in draw order.
+
+        Args
+        ----
+        rect : pygame.Rect
+            Rectangle in level coordinates.
+
+        Returns
+        -------
+        out : list[pygame.sprite.Sprite]
+            Sprites inside rect.
+        """
+        if self._touched:
+            self._flush()
+
+        size = self.cell_size
+        found = {}
+
+        for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            for column in range(rect.left // size, (rect.right - 1) // size + 1):
+                cell = self.cells.get((column, row))
+                if cell:
+                    for sprite, order in cell.items():
+                        found[order] = sprite
+
+        # A sprite can be in several cells, and those cells may only partly overlap rect. Check the exact area and restore draw order.
+        return [sprite for order, sprite in sorted(found.items()) if rect.colliderect(sprite.rect.topleft, sprite.image.get_size())]
+
+class HashedGroup(pg.sprite.Group):
+    """ Sprite group which keeps a SpriteHash of its sprites. Sprites are inserted into the hash when added to the group and removed when killed, so the
+    draw order of the hash is the order of the group.
+
+    Attributes
+    ----------
+    hash : SpriteHash
+        Spatial hash of the sprites of the group.
+    """
+    def __init__(self, sprite_hash:SpriteHash, *sprites):
+        """
+        Args
+        ----
+        sprite_hash : SpriteHash
+            Hash to keep the sprites in.
+        *sprites : pygame.sprite.Sprite
+            Sprites to add.
+        """
+        self.hash = sprite_hash
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None) -> None:
+        super().add_internal(sprite, layer)
+        self.hash.insert(sprite)
+
+    def remove_internal(self, sprite) -> None:
+        super().remove_internal(sprite)
+        self.hash.remove(sprite)
+
+class PadIndex:
+    """ Index of the landing pads of a level, for choosing where to respawn. A pad is a connected group of landing pad tiles, found once when the level is
+    built, so pad tiles stacked on top of each other are one pad rather than one per row. Players land on top of a pad, therefore the rect of a pad is its
+    topmost horizontal run of tiles. The centers of all pads are kept in a NumPy array, so a query is one vectorized pass over the pads, and no sprites or
+    vectors are made. When a pad tile is added or removed at runtime, update() finds only the pads around that tile again.
+
+    Attributes
+    ----------
+    rects : list[pygame.Rect]
+        Rect of the topmost run of each pad, ordered by the position of that run, row by row.
+    centers : numpy.ndarray
+        Center of the topmost run of each pad, where players respawn, shape (pads, 2). Queries measure distances to these, not to the middle of the
+        whole pad.
+
+    Methods
+    -------
+    update(column, row)
+        Find the pads around a tile again after it changed.
+    furthest(pos)
+        Return the pad furthest from a position.
+    furthest_k(pos, k)
+        Return the k pads furthest from a position.
+    safest(threats)
+        Return the pad furthest from the nearest of several positions.
+    """
+    def __init__(self, tilemap, tile="l"):
+        """
+        Args
+        ----
+        tilemap : Map
+            Map to index.
+        tile : str
+            Symbol of landing pad tiles. (default "l")
+        """
+        self._grid = tilemap.grid
+        self._tile = ord(tile)
+
+        rows, columns, lengths, _ = wall_runs(tilemap.grid, tile)
+        rows, columns, ends = rows.tolist(), columns.tolist(), (columns + lengths).tolist()
+
+        # Join runs in neighbouring rows which share a column. Runs are row by row, so the runs touching a run from below follow it, and the first run of
+        # each group is its topmost.
+        group = list(range(len(rows)))
+
+        def find(i):
+            while group[i] != i:
+                group[i] = group[group[i]]
+                i = group[i]
+            return i
+
+        for i in range(len(rows)):
+            for j in range(i + 1, len(rows)):
+                if rows[j] > rows[i] + 1:
+                    break
+                if rows[j] == rows[i] + 1 and columns[j] < ends[i] and columns[i] < ends[j]:
+                    a, b = find(i), find(j)
+                    group[max(a, b)] = min(a, b)
+
+        # Each pad is keyed by (row, column) of the first tile of its topmost run, and every pad tile knows the key of its pad, so that update() can
+        # find the pads around a tile without looking at the rest of the level.
+        self._pads = {}
+        self._members = {}
+        self._pad_at = {}
+        for i in range(len(rows)):
+            root = find(i)
+            key = (rows[root], columns[root])
+            if root == i:
+                self._pads[key] = pg.Rect(columns[i] * TILESIZE, rows[i] * TILESIZE, (ends[i] - columns[i]) * TILESIZE, TILESIZE)
+                self._members[key] = []
+            tiles = [(column, rows[i]) for column in range(columns[i], ends[i])]
+            self._members[key] += tiles
+            self._pad_at.update(dict.fromkeys(tiles, key))
+
+        self._index()
+
+    def _index(self) -> None:
+        """ Order the pads row by row, by the position of their topmost run, and collect their rects and centers. """
+        self.rects = [self._pads[key] for key in sorted(self._pads)]
+        self.centers = np.array([rect.center for rect in self.rects], dtype=float).reshape(-1, 2)
+
+    def _is_pad(self, column:int, row:int) -> bool:
+        """ Return True if the tile at column, row is a landing pad tile. """
+        height, width = self._grid.shape
+        return 0 <= row < height and 0 <= column < width and self._grid[row, column] == self._tile
+
+    def update(self, column:int, row:int) -> None:
+        """ Find the pads around a tile again after it changed, e.g. when a pad tile is added or removed. Adding a tile may join pads, and removing one
+        may split a pad, so the pads containing the tile or its neighbours are dropped and their tiles grouped again. Only those pads are looked at.
+
+        Args
+        ----
+        column, row : int, int
+            Tile which changed. The grid of the map must already hold its new symbol.
+        """
+        neighbours = ((column, row), (column - 1, row), (column + 1, row), (column, row - 1), (column, row + 1))
+
+        # Drop the pads touching the tile, their tiles are grouped again below together with the tile itself.
+        seeds = [(column, row)]
+        for key in {self._pad_at[pos] for pos in neighbours if pos in self._pad_at}:
+            del self._pads[key]
+            for pos in self._members.pop(key):
+                del self._pad_at[pos]
+                seeds.append(pos)
+
+        # Flood fill the pads from the seeds, over pad tiles sharing an edge.
+        for seed in seeds:
+            if seed in self._pad_at or not self._is_pad(*seed):
+                continue
+            members = [seed]
+            self._pad_at[seed] = None
+            for c, r in members:
+                for pos in ((c - 1, r), (c + 1, r), (c, r - 1), (c, r + 1)):
+                    if pos not in self._pad_at and self._is_pad(*pos):
+                        self._pad_at[pos] = None
+                        members.append(pos)
+
+            # The topmost run starts at the leftmost tile of the top row of the pad.
+            top_column, top_row = min(members, key=lambda pos: (pos[1], pos[0]))
+            end = top_column
+            while self._is_pad(end + 1, top_row):
+                end += 1
+
+            key = (top_row, top_column)
+            self._pads[key] = pg.Rect(top_column * TILESIZE, top_row * TILESIZE, (end - top_column + 1) * TILESIZE, TILESIZE)
+            self._members[key] = members
+            self._pad_at.update(dict.fromkeys(members, key))
+
+        self._index()
+
+    def _distances(self, pos) -> np.ndarray:
+        """ Return the squared distance from each pad center to pos. """
+        d = self.centers - np.asarray(pos, dtype=float)
+        return np.einsum("ij,ij->i", d, d)
+
+    def furthest(self, pos) -> pg.Rect:
+        """ Return the pad furthest from a position. Of equally far pads the first is chosen.
+
+        Args
+        ----
+        pos : pygame.math.Vector2|tuple
+            Position in level coordinates.
+
+        Returns
+        -------
+        rect : pygame.Rect|None
+            Rect of the pad, None if the level has no pads.
+        """
+        if not self.rects:
+            return None
+        return self.rects[int(np.argmax(self._distances(pos)))]
+
+    def furthest_k(self, pos, k:int) -> list:
+        """ Return the k pads furthest from a position.
+
+        Args
+        ----
+        pos : pygame.math.Vector2|tuple
+            Position in level coordinates.
+        k : int
+            Number of pads. All pads are returned if there are fewer.
+
+        Returns
+        -------
+        rects : list[pygame.Rect]
+            Rects of the pads, furthest first.
+        """
+        distances = self._distances(pos)
+        k = min(k, len(distances))
+        if k == 0:
+            return []
+
+        # Only the k furthest pads are sorted.
+        top = np.argpartition(-distances, k - 1)[:k]
+        top = top[np.argsort(-distances[top], kind="stable")]
+        return [self.rects[i] for i in top.tolist()]
+
+    def safest(self, threats) -> pg.Rect:
+        """ Return the pad furthest from the nearest of several positions, e.g. all opponents. With one position this is the furthest pad.
+
+        Args
+        ----
+        threats : iterable[pygame.math.Vector2|tuple]
+            Positions in level coordinates.
+
+        Returns
+        -------
+        rect : pygame.Rect|None
+            Rect of the pad, None if the level has no pads. The first pad if there are no threats.
+        """
+        threats = np.asarray([tuple(threat) for threat in threats], dtype=float).reshape(-1, 2)
+        if not self.rects:
+            return None
+        if not len(threats):
+            return self.rects[0]
+
+        # Squared distance from every pad to every threat, shape (pads, threats).
+        d = self.centers[:, None, :] - threats[None, :, :]
+        nearest = np.einsum("ijk,ijk->ij", d, d).min(axis=1)
+        return self.rects[int(np.argmax(nearest))]
+
+    def __len__(self) -> int:
+        return len(self.rects)
@@ -1,8 +1,7 @@
-""" Module containing Base class MayhemSprite and child class Wall. Also has FuelTank and Scoreboard sprites. Generally things which are drawn to the
-screen are contained here with some exceptions. """
+""" Module containing Base class MayhemSprite and child class Wall. Also has FuelTank and Scoreboard sprites, and the SpritePool which keeps killed sprites
+for reuse. Generally things which are drawn to the screen are contained here with some exceptions. """
 
 import pygame as pg
-import numpy as np
 from config import *
 from game_base_module.settings import *
 from game_base_module import map_val, draw_text
@@ -32,7 +31,8 @@ class MayhemSprite(pg.sprite.Sprite):
             y: int,
             w: int,
             h: int,
-            texture=None
+            texture=None,
+            mask=None
             ):
         """
         Args
@@ -43,12 +43,14 @@ class MayhemSprite(pg.sprite.Sprite):
             Dimensions of object.
         texture : pygame.Surface|None
             Texture and image of sprite. (Default None)
+        mask : pygame.mask.Mask|None
+            Mask of texture, shared with other sprites. Made from texture if None. (Default None)
         """
 
         super().__init__(groups)
         self.image = texture
         self.texture = texture
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = pg.mask.from_surface(self.image) if mask is None else mask
         self.rect = self.image.get_rect()
         self.x = x
         self.y = y
@@ -79,6 +81,7 @@ class Wall(MayhemSprite):
             y: int,
             texture: str,
             texture_id: str,
+            mask=None
             ):
         """
         Args
@@ -91,11 +94,89 @@ class Wall(MayhemSprite):
             Texture and image of sprite.
         texture_id : str
             String representing what symbol was read from the map text file.
+        mask : pygame.mask.Mask|None
+            Mask of texture shared by all walls with this texture id. Made from texture if None. (Default None)
         """
 
-        super().__init__(group, x, y, TILESIZE, TILESIZE, texture=texture)
+        super().__init__(group, x, y, TILESIZE, TILESIZE, texture=texture, mask=mask)
         self.texture_id = texture_id
 
+class SpritePool:
+    """ Pool of killed sprites kept for reuse, so sprites which come and go all the time, e.g. lasers, are made once and then reset instead of made
+    again. Sprites in a pool have a reset() method taking the same arguments as making one, and put themselves back in the pool when killed.
+
+    A sprite killed during a tick may still be read until the tick ends, therefore killed sprites are only reused after recycle() is called at the start
+    of the next tick, like rows of bodies in PhysicsWorld.
+
+    Attributes
+    ----------
+    cls : type
+        Class of the sprites.
+    free : list
+        Sprites ready to be reused.
+    made : int
+        Number of sprites made by the pool.
+
+    Methods
+    -------
+    acquire(*args)
+        Return a reset sprite, or a new one if none is free.
+    release(sprite)
+        Put a killed sprite in the pool.
+    recycle()
+        Make the sprites released since the last call ready to be reused.
+    """
+    def __init__(self, cls:type):
+        """
+        Args
+        ----
+        cls : type
+            Class of the sprites, with a reset() method taking the same arguments as cls().
+        """
+        self.cls = cls
+        self.free = []
+        self.made = 0
+        self._released = []
+
+    def acquire(self, *args) -> pg.sprite.Sprite:
+        """ Return a reset sprite, or a new one if none is free.
+
+        Args
+        ----
+        *args : any
+            Arguments of cls() and reset().
+
+        Returns
+        -------
+        sprite : pygame.sprite.Sprite
+            Sprite as if made with args.
+        """
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args)
+            return sprite
+        self.made += 1
+        return self.cls(*args)
+
+    def release(self, sprite:pg.sprite.Sprite) -> None:
+        """ Put a killed sprite in the pool. It is reused after the next recycle().
+
+        Args
+        ----
+        sprite : pygame.sprite.Sprite
+            Sprite which is not in any group.
+        """
+        self._released.append(sprite)
+
+    def recycle(self) -> None:
+        """ Make the sprites released since the last call ready to be reused. Call at the start of a tick. """
+        if self._released:
+            self.free += self._released
+            self._released = []
+
+    def __len__(self) -> int:
+        return len(self.free) + len(self._released)
+
 class FuelTank(pg.sprite.Sprite):
     """ Fuel tank object attached to a Player object. Child class of pygame.sprite.Sprite.
     
@@ -116,21 +197,30 @@ class FuelTank(pg.sprite.Sprite):
     
     Methods
     -------
+    reset(player)
+        Fill the tank and show it on the screen of player.
     update()
         Updates the size of the overlayed amount_surf surface to reflect the amount of fuel left in the tank.
     draw(surf)
         Blits image to surf (main surface).
     """
     def __init__(self, player):
-        super().__init__(player.game.all_statuses)
+        super().__init__()
         w, h = 100, 20
         self.image = pg.Surface((w, h), pg.SRCALPHA)
-        self.rect = self.image.get_rect(topleft=vec(player.screen.rect.topleft) + vec(100, 40))
+        self.rect = self.image.get_rect()
         self.image.fill(RED)
         self.amount_surf = pg.Surface((w, h), pg.SRCALPHA)
-        self.amount_rect = self.amount_surf.get_rect(topleft=self.rect.topleft)
+        self.amount_rect = self.amount_surf.get_rect()
         self.amount_surf.fill(GREEN)
         self.max_amount = 2000
+        self.reset(player)
+
+    def reset(self, player) -> None:
+        """ Fill the tank and show it on the screen of player. The surfaces are kept, so a respawned player reuses the tank of a dead one. """
+        self.add(player.game.all_statuses)
+        self.rect.topleft = vec(player.screen.rect.topleft) + vec(100, 40)
+        self.amount_rect.topleft = self.rect.topleft
         self.amount = self.max_amount
 
     def update(self):
@@ -167,13 +257,15 @@ class Scoreboard(pg.sprite.Sprite):
         Rectangle of image.
     _scores : dict
         Keeps track of scores.
-    _prev_scores : dict
-        Keeps track of previous score.
+    _dirty : bool
+        True if scores have changed since image was last drawn.
+    _stats : dict
+        Number of kills and deaths by crashing into walls of each player.
     
     Methods
     -------
     update()
-        Update what to be shown in the scores.
+        Update what to be shown in the scores, only if they have changed.
     draw(surf)
         Draw image to surf which is main screen.
     @property(scores)
@@ -182,6 +274,12 @@ class Scoreboard(pg.sprite.Sprite):
         Give a point to player number player_n
     take_point(player_n)
         Take a point from player_n unless player has zero points.
+    @property(stats)
+        A Getter of kills and wall deaths.
+    record_kill(player_n)
+        Count a kill for player_n.
+    record_wall_death(player_n)
+        Count a crash into a wall for player_n.
     reset_score()
         Set all scores to zero.
     __str__()
@@ -198,10 +296,15 @@ class Scoreboard(pg.sprite.Sprite):
         self.image = pg.Surface((100, 100), pg.SRCALPHA)
         self.rect = self.image.get_rect(midtop=game.center + vec(0, -game.height // 2))
         self._scores = {"1": 0, "2": 0}
-        self._prev_scores = self._scores
+        self._dirty = True
+        self._stats = {"1": {"kills": 0, "wall_deaths": 0}, "2": {"kills": 0, "wall_deaths": 0}}
 
     def update(self) -> None:
-        """ Update what to be shown in the scores. """
+        """ Update what to be shown in the scores, only if they have changed. """
+
+        if not self._dirty:
+            return
+        self._dirty = False
 
         self.image.fill((50, 50, 50))
         draw_text(self.image, "SCORES", 32, self.rect.w // 2, self.rect.h // 5, WHITE, True)
@@ -220,6 +323,40 @@ class Scoreboard(pg.sprite.Sprite):
 
         return self._scores
 
+    @property
+    def stats(self) -> dict:
+        """ A Getter of kills and wall deaths. Unlike scores these only count up.
+
+        Returns
+        -------
+        out : dict
+            For each player a dict with the number of "kills" and "wall_deaths".
+        """
+
+        return self._stats
+
+    def record_kill(self, player_n : str) -> None:
+        """ Count a kill for player number player_n.
+
+        Args
+        ----
+        player_n: str
+            Either "1" or "2" indicating player 1 or 2.
+        """
+
+        self._stats[player_n]["kills"] += 1
+
+    def record_wall_death(self, player_n : str) -> None:
+        """ Count a crash into a wall for player number player_n.
+
+        Args
+        ----
+        player_n: str
+            Either "1" or "2" indicating player 1 or 2.
+        """
+
+        self._stats[player_n]["wall_deaths"] += 1
+
     def give_point(self, player_n : str) -> None:
         """ Give a point to player number player_n.
 
@@ -230,6 +367,7 @@ class Scoreboard(pg.sprite.Sprite):
         """
 
         self._scores[player_n] += 1
+        self._dirty = True
 
     def take_point(self, player_n : str) -> None:
         """ Remove a point from player number player_n.
@@ -242,12 +380,16 @@ class Scoreboard(pg.sprite.Sprite):
         if self._scores[player_n] <= 0:
             return
         self._scores[player_n] -= 1
+        self._dirty = True
 
     def reset_score(self) -> None:
         """ Set all scores to zero. """
 
+        if self._scores["1"] == 0 and self._scores["2"] == 0:
+            return
         self._scores["1"] = 0
         self._scores["2"] = 0
+        self._dirty = True
 
     def __str__(self) -> str:
         """ Prettier printing. 
@@ -0,0 +1,309 @@
+""" This module contains helpers for preparing textures for drawing. The RotationCache class keeps rotated versions of textures so that sprites which rotate
+do not have to rotate their image and rebuild their mask every frame. The TextureAtlas class packs many small textures into one surface, which is cached on
+disk so that starting the game reads one file instead of every image.
+"""
+
+import os
+import json
+import struct
+from collections import OrderedDict
+
+import pygame as pg
+import numpy as np
+from config import *
+from game_base_module.settings import GREEN
+
+def rotate_img(img: pg.Surface, angle: int) -> tuple[pg.Surface, pg.Rect, pg.mask.Mask]:
+    """ Rotates image by given angle.
+
+    Args
+    ----
+    img: pygame.Surface
+        Original image.
+    angle: float
+        Angle to be rotated by
+
+    Returns
+    -------
+    rot_img : pygame.Surface
+        New rotated image.
+    new_rect : pygame.Rect
+        new rotated (and scaled) rect.
+    new_mask : pygame.mask.Mask
+    """
+
+    old_center = img.get_rect().center
+    rot_img = pg.transform.rotate(img, angle)
+    rot_img.set_colorkey(GREEN)
+    new_rect = rot_img.get_rect(center=old_center)
+    new_mask = pg.mask.from_surface(rot_img)
+    return rot_img, new_rect, new_mask
+
+class RotationCache:
+    """ Cache of rotated textures. Rotations are computed lazily the first time a texture is requested at an angle, and the least recently used rotation is
+    dropped when the cache is full. Sprites only rotate in steps of 2 degrees, so a handful of textures fit in a small cache.
+
+    Attributes
+    ----------
+    maxsize : int
+        Maximum number of rotations kept.
+
+    Methods
+    -------
+    get(img, angle)
+        Return the rotated image, its rect and mask.
+    """
+    def __init__(self, maxsize=ROTATION_CACHE_SIZE):
+        """
+        Args
+        ----
+        maxsize : int
+            Maximum number of rotations kept. (default ROTATION_CACHE_SIZE)
+        """
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def get(self, img:pg.Surface, angle:int) -> tuple[pg.Surface, pg.Rect, pg.mask.Mask]:
+        """ Return the rotated image, its rect and mask. The image and mask are shared and must not be modified, the rect is a copy.
+
+        Args
+        ----
+        img : pygame.Surface
+            Original image.
+        angle : int
+            Angle to be rotated by.
+
+        Returns
+        -------
+        rot_img : pygame.Surface
+            Rotated image.
+        new_rect : pygame.Rect
+            Rect of rotated image, centered on the center of the original image.
+        new_mask : pygame.mask.Mask
+            Mask of rotated image.
+        """
+        key = (img, angle % 360)
+        rotation = self._cache.get(key)
+
+        if rotation is None:
+            rotation = rotate_img(img, angle % 360)
+            self._cache[key] = rotation
+
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+
+        rot_img, new_rect, new_mask = rotation
+        return rot_img, new_rect.copy(), new_mask
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+# Atlas cache file: a header with a magic number, format version, length of the index and size of the atlas, followed by the index as JSON and the
+# pixels of the atlas as RGBA bytes.
+ATLAS_MAGIC = b"MAYA"
+ATLAS_VERSION = 1
+ATLAS_HEADER = struct.Struct("<4sHIII")
+
+def surface_pixels(surf:pg.Surface) -> np.ndarray:
+    """ Copy the pixels of a surface.
+
+    Args
+    ----
+    surf : pygame.Surface
+        Surface to copy.
+
+    Returns
+    -------
+    pixels : numpy.ndarray
+        RGBA pixels of shape (height, width, 4), which do not share memory with surf.
+    """
+    w, h = surf.get_size()
+    return np.frombuffer(pg.image.tostring(surf, "RGBA"), dtype=np.uint8).reshape(h, w, 4)
+
+class TextureAtlas:
+    """ Many textures packed into one surface. Every texture is a region of the atlas, named by its path relative to the texture directory with / as
+    separator, e.g. "blocks/w.png". Textures can be taken out as subsurfaces of surface at area(name), which share the pixels of the atlas, or blitted
+    directly from surface using area(name) as the area argument of blit. AssetManager reads the atlas from its cache and packs new ones.
+
+    Attributes
+    ----------
+    surface : pygame.Surface
+        The atlas.
+    regions : dict
+        Maps the name of each texture to its rect in surface.
+
+    Methods
+    -------
+    area(name)
+        Return the rect of a texture in the atlas.
+    pack(sizes, width=1024, padding=1)
+        Pack rectangles into rows of an atlas.
+    from_images(images)
+        Pack images into a new atlas.
+    from_pixels(pixels)
+        Pack arrays of RGBA pixels into a new atlas.
+    read(path)
+        Read an atlas and the modification times of its textures from a cache file.
+    save(path, sources)
+        Write the atlas to a cache file.
+    """
+    def __init__(self, surface:pg.Surface, regions:dict):
+        """
+        Args
+        ----
+        surface : pygame.Surface
+            The atlas.
+        regions : dict
+            Maps the name of each texture to its rect in surface.
+        """
+        self.surface = surface
+        self.regions = regions
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.regions
+
+    def area(self, name:str) -> pg.Rect:
+        """ Return the rect of a texture in the atlas.
+
+        Args
+        ----
+        name : str
+            Name of texture.
+
+        Returns
+        -------
+        area : pygame.Rect
+            Rect of texture in surface.
+        """
+        return self.regions[name]
+
+    @staticmethod
+    def pack(sizes:dict, width=1024, padding=1) -> tuple[dict, tuple[int, int]]:
+        """ Pack rectangles into rows of an atlas, tallest first.
+
+        Args
+        ----
+        sizes : dict
+            Maps names to (width, height) of the rectangles.
+        width : int
+            Width of the atlas, widened to fit the widest rectangle. (default 1024)
+        padding : int
+            Space between rectangles. (default 1)
+
+        Returns
+        -------
+        regions : dict
+            Maps names to rects in the atlas.
+        size : tuple[int, int]
+            Size of the atlas.
+        """
+        width = max([width] + [w for w, _ in sizes.values()])
+        regions = {}
+        x = y = row_height = 0
+
+        for name in sorted(sizes, key=lambda name: (-sizes[name][1], name)):
+            w, h = sizes[name]
+
+            # Start a new row when the rectangle does not fit in the current one.
+            if x + w > width:
+                x, y = 0, y + row_height + padding
+                row_height = 0
+
+            regions[name] = pg.Rect(x, y, w, h)
+            x += w + padding
+            row_height = max(row_height, h)
+
+        return regions, (width, y + row_height)
+
+    @classmethod
+    def from_images(cls, images:dict):
+        """ Pack images into a new atlas.
+
+        Args
+        ----
+        images : dict
+            Maps names to images.
+
+        Returns
+        -------
+        atlas : TextureAtlas
+            The new atlas.
+        """
+        return cls.from_pixels({name: surface_pixels(img) for name, img in images.items()})
+
+    @classmethod
+    def from_pixels(cls, pixels:dict):
+        """ Pack arrays of RGBA pixels into a new atlas. Unlike from_images no surfaces are read, so this is safe on a thread other than the one using
+        the surfaces the pixels were copied from.
+
+        Args
+        ----
+        pixels : dict
+            Maps names to arrays of RGBA pixels of shape (height, width, 4), see surface_pixels.
+
+        Returns
+        -------
+        atlas : TextureAtlas
+            The new atlas.
+        """
+        regions, (width, height) = cls.pack({name: (img.shape[1], img.shape[0]) for name, img in pixels.items()})
+
+        # Pixels are copied as bytes rather than blitted, blitting onto a transparent surface would blend the colors of translucent pixels.
+        sheet = np.zeros((height, width, 4), dtype=np.uint8)
+        for name, img in pixels.items():
+            rect = regions[name]
+            sheet[rect.top:rect.bottom, rect.left:rect.right] = img
+
+        return cls(pg.image.fromstring(sheet.tobytes(), (width, height), "RGBA"), regions)
+
+    @classmethod
+    def read(cls, path:str):
+        """ Read an atlas from a cache file.
+
+        Args
+        ----
+        path : str
+            Path to cache file.
+
+        Returns
+        -------
+        atlas : TextureAtlas|None
+            The atlas, or None if there is no valid cache file.
+        sources : dict
+            Maps the name of each texture to the modification time of the file it was packed from. Empty if there is no valid cache file.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, version, index_size, width, height = ATLAS_HEADER.unpack_from(data)
+            if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+                return None, {}
+            index = json.loads(data[ATLAS_HEADER.size:ATLAS_HEADER.size + index_size])
+            surface = pg.image.fromstring(data[ATLAS_HEADER.size + index_size:], (width, height), "RGBA")
+            return cls(surface, {name: pg.Rect(region) for name, region in index["regions"].items()}), index["sources"]
+        except (OSError, ValueError, KeyError, struct.error):
+            return None, {}
+
+    def save(self, path:str, sources:dict) -> None:
+        """ Write the atlas to a cache file.
+
+        Args
+        ----
+        path : str
+            Path to cache file. Missing directories are made.
+        sources : dict
+            Maps the name of each texture to the modification time of its file, used to check if the cache is up to date.
+        """
+        index = json.dumps({"sources": sources, "regions": {name: list(rect) for name, rect in self.regions.items()}}).encode()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # Write to a file of this process and move it in place, so that games started at the same time, e.g. the workers of batch.py, never read or
+        # write a half written cache.
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(ATLAS_HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, len(index), *self.surface.get_size()))
+            f.write(index)
+            f.write(pg.image.tostring(self.surface, "RGBA"))
+        os.replace(tmp, path)